@@ -80,3 +80,8 @@ class User(AbstractUser):
         Check if the user can add another property.
         """
         return self._can_add_item("properties", FREE_PLAN_MAX_LISTINGS, "max_listings")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_joined"]),
+        ]
@@ -19,6 +19,7 @@ from django.contrib.auth.views import (
 from django.shortcuts import redirect
 from django.views.generic import FormView, TemplateView
 
+from analytic.models import PropertyDailyStats
 from core.views import (
     BaseAdminCreateView,
     BaseAdminDeleteView,
@@ -120,6 +121,20 @@ class CustomerDashboardView(LoginRequiredMixin, TemplateView):
         context["active_listings"] = Property.objects.filter(
             user=self.request.user
         ).count()
+        listing_stats = PropertyDailyStats.objects.filter(
+            property__user=self.request.user
+        )
+        context["listing_stats"] = PropertyDailyStats.get_totals(
+            days=30, queryset=listing_stats
+        )
+        context["listing_visitors"] = {
+            "week": PropertyDailyStats.get_unique_viewers(
+                days=7, queryset=listing_stats
+            ),
+            "month": PropertyDailyStats.get_unique_viewers(
+                days=30, queryset=listing_stats
+            ),
+        }
         return context
 
 
@@ -1,11 +1,20 @@
 from django.contrib import admin
 
-from .models import BrowsingHistory, LikeHistory, SearchHistory
+from .models import (
+    BrowsingHistory,
+    LikeHistory,
+    PopularSearch,
+    PropertyDailyStats,
+    PropertySimilarity,
+    SearchDailyStats,
+    SearchHistory,
+    SiteDailyStats,
+)
 
 
 @admin.register(BrowsingHistory)
 class BrowsingHistoryAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "property", "timestamp")
+    list_display = ("id", "user", "property", "day", "timestamp")
 
     def has_add_permission(self, request):
         return False
@@ -16,7 +25,7 @@ class BrowsingHistoryAdmin(admin.ModelAdmin):
 
 @admin.register(SearchHistory)
 class SearchHistoryAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "timestamp")
+    list_display = ("id", "user", "query", "hit_count", "last_seen")
 
     def has_add_permission(self, request):
         return False
@@ -34,3 +43,58 @@ class LikeHistoryAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, *args, **kwargs):
         return False
+
+
+@admin.register(PropertyDailyStats)
+class PropertyDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("id", "property", "day", "views", "unique_viewers", "likes")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, *args, **kwargs):
+        return False
+
+
+@admin.register(SiteDailyStats)
+class SiteDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("id", "day")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, *args, **kwargs):
+        return False
+
+
+@admin.register(SearchDailyStats)
+class SearchDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("id", "day", "query", "location", "type", "post_type", "searches")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, *args, **kwargs):
+        return False
+
+
+@admin.register(PopularSearch)
+class PopularSearchAdmin(admin.ModelAdmin):
+    list_display = ("id", "day", "dimension", "value", "count", "error")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, *args, **kwargs):
+        return False
+
+
+@admin.register(PropertySimilarity)
+class PropertySimilarityAdmin(admin.ModelAdmin):
+    list_display = ("id", "source", "similar", "kind", "score", "rank")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, *args, **kwargs):
+        return False
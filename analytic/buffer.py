@@ -0,0 +1,255 @@
+import logging
+import queue
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from property.models import Property
+
+from .models import (
+    BrowsingHistory,
+    PropertyDailyStats,
+    SearchHistory,
+    SiteDailyStats,
+)
+from .trending import TRENDING_WEIGHTS, add_trending_event
+from .workers import PeriodicWorker, process_singleton
+
+logger = logging.getLogger("app")
+
+
+class ViewEventBuffer(PeriodicWorker):
+    """
+    Write-behind buffer for property views.
+
+    Requests only put (user id, property id, day) events on a bounded
+    in-memory queue, a background thread writes them every `flush_interval`
+    seconds with a single `bulk_create` and adds them to the daily stats,
+    the viewer sketches and the view counters. Events are dropped and
+    counted when the queue is full, and the queue is flushed once more when
+    the process exits.
+    """
+
+    thread_name = "view-event-buffer"
+
+    def __init__(self, max_size=10_000, flush_interval=5.0, batch_size=1000):
+        super().__init__(interval=flush_interval)
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.metrics = {"recorded": 0, "dropped": 0, "flushed": 0, "failed": 0}
+        self._dropped_since_flush = 0
+        self._flush_lock = threading.Lock()
+
+    def record(self, user_id, property_id):
+        self._start()
+        try:
+            self.queue.put_nowait((user_id, property_id, timezone.localdate()))
+        except queue.Full:
+            self._count("dropped")
+            with self._lock:
+                self._dropped_since_flush += 1
+        else:
+            self._count("recorded")
+
+    def get_metrics(self):
+        with self._lock:
+            return {**self.metrics, "queued": self.queue.qsize()}
+
+    def flush(self):
+        """
+        Write every queued event, returns the number of new history rows.
+        """
+        with self._lock:
+            dropped, self._dropped_since_flush = self._dropped_since_flush, 0
+        if dropped:
+            logger.warning(f"View buffer full, dropped {dropped} property views")
+
+        with self._flush_lock:
+            events = Counter()
+            while True:
+                try:
+                    events[self.queue.get_nowait()] += 1
+                except queue.Empty:
+                    break
+            if not events:
+                return 0
+
+            try:
+                created = self._write(events)
+            except DatabaseError:
+                count = events.total()
+                logger.exception(f"Dropped {count} buffered property views")
+                self._count("failed", count)
+                return 0
+
+            self._count("flushed", events.total())
+            return created
+
+    def _write(self, events):
+        from .views import PropertyRecommender
+
+        existing = set(
+            BrowsingHistory.objects.filter(
+                user_id__in={user_id for user_id, _, _ in events},
+                property_id__in={property_id for _, property_id, _ in events},
+                day__in={day for _, _, day in events},
+            ).values_list("user_id", "property_id", "day")
+        )
+        new_events = events.keys() - existing
+
+        counts = defaultdict(Counter)
+        property_views = Counter()
+        viewers = defaultdict(set)
+        site_viewers = defaultdict(set)
+        for (user_id, property_id, day), views in events.items():
+            counts[property_id, day]["views"] += views
+            property_views[property_id] += views
+            viewers[property_id, day].add(user_id)
+            site_viewers[day].add(user_id)
+        for _, property_id, day in new_events:
+            counts[property_id, day]["unique_viewers"] += 1
+
+        with transaction.atomic():
+            BrowsingHistory.objects.bulk_create(
+                [
+                    BrowsingHistory(user_id=user_id, property_id=property_id, day=day)
+                    for user_id, property_id, day in new_events
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            PropertyDailyStats.increment(counts)
+            PropertyDailyStats.add_viewers(viewers)
+            SiteDailyStats.add_viewers(site_viewers)
+            for property_id, views in property_views.items():
+                Property.objects.filter(pk=property_id).update(
+                    view_count=F("view_count") + views,
+                    trending_score=add_trending_event(views * TRENDING_WEIGHTS["view"]),
+                )
+
+        for user_id in {user_id for user_id, _, _ in new_events}:
+            PropertyRecommender.invalidate(user_id)
+        return len(new_events)
+
+    def run_once(self):
+        self.flush()
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self.metrics[metric] += value
+
+
+@process_singleton
+def get_view_buffer():
+    """
+    Return the view event buffer of this process.
+    """
+    return ViewEventBuffer(
+        max_size=settings.VIEW_BUFFER_MAX_SIZE,
+        flush_interval=settings.VIEW_BUFFER_FLUSH_INTERVAL,
+        batch_size=settings.VIEW_BUFFER_BATCH_SIZE,
+    )
+
+
+class SearchEventBuffer(PeriodicWorker):
+    """
+    Write-behind buffer for searches.
+
+    Requests only put (user id, normalized values) events on a bounded
+    in-memory queue, a background thread groups them by user and signature
+    every `flush_interval` seconds and bumps the hit count of each search,
+    or inserts it the first time it is seen.
+    """
+
+    thread_name = "search-event-buffer"
+
+    def __init__(self, max_size=10_000, flush_interval=5.0):
+        super().__init__(interval=flush_interval)
+        self.queue = queue.Queue(maxsize=max_size)
+        self._dropped_since_flush = 0
+        self._flush_lock = threading.Lock()
+
+    def record(self, user_id, values):
+        self._start()
+        try:
+            self.queue.put_nowait((user_id, values, timezone.now()))
+        except queue.Full:
+            with self._lock:
+                self._dropped_since_flush += 1
+
+    def flush(self):
+        """
+        Write every queued search, returns the number of new history rows.
+        """
+        with self._lock:
+            dropped, self._dropped_since_flush = self._dropped_since_flush, 0
+        if dropped:
+            logger.warning(f"Search buffer full, dropped {dropped} searches")
+
+        with self._flush_lock:
+            searches = {}
+            while True:
+                try:
+                    user_id, values, seen = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                key = (user_id, SearchHistory.get_signature(values))
+                hits, _, _ = searches.get(key, (0, values, seen))
+                searches[key] = (hits + 1, values, seen)
+            if not searches:
+                return 0
+
+            try:
+                return self._write(searches)
+            except DatabaseError:
+                logger.exception(f"Dropped {len(searches)} buffered searches")
+                return 0
+
+    def _write(self, searches):
+        from .views import PropertyRecommender
+
+        new_users = set()
+        for (user_id, signature), (hits, values, seen) in searches.items():
+            if self._bump(user_id, signature, hits, seen):
+                continue
+            try:
+                with transaction.atomic():
+                    SearchHistory.objects.create(
+                        user_id=user_id,
+                        signature=signature,
+                        hit_count=hits,
+                        last_seen=seen,
+                        **values,
+                    )
+            except IntegrityError:
+                # recorded concurrently by another process
+                self._bump(user_id, signature, hits, seen)
+            else:
+                new_users.add(user_id)
+
+        for user_id in new_users:
+            PropertyRecommender.invalidate(user_id)
+        return len(new_users)
+
+    def _bump(self, user_id, signature, hits, seen):
+        return SearchHistory.objects.filter(
+            user_id=user_id, signature=signature
+        ).update(hit_count=F("hit_count") + hits, last_seen=seen)
+
+    def run_once(self):
+        self.flush()
+
+
+@process_singleton
+def get_search_buffer():
+    """
+    Return the search event buffer of this process.
+    """
+    return SearchEventBuffer(
+        max_size=settings.SEARCH_BUFFER_MAX_SIZE,
+        flush_interval=settings.SEARCH_BUFFER_FLUSH_INTERVAL,
+    )
@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.db.models import Max
+
+from accounts.models import User
+from property.models import Property
+
+from .models import BrowsingHistory, LikeHistory, PropertySimilarity
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# interaction weights, a like says more about a property than a view
+LIKE_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+
+# number of neighbours stored per property
+INTERACTION_NEIGHBOURS_TOP_K = 20
+
+INTERACTIONS = PropertySimilarity.Kind.INTERACTIONS
+
+
+class InteractionMatrix:
+    """
+    Sparse user by property matrix of weighted views and likes.
+
+    History rows are streamed in chunks and buffered as coordinate arrays,
+    the buffer is folded into the CSR matrix every `buffer_size` rows, so
+    memory stays bounded by the number of distinct (user, property) pairs.
+    """
+
+    def __init__(self, property_ids, user_count, buffer_size=1_000_000):
+        self.property_ids = property_ids
+        self.shape = (user_count, len(property_ids))
+        self.buffer_size = buffer_size
+        self.matrix = sparse.csr_matrix(self.shape, dtype=np.float32)
+        self._rows, self._columns, self._weights = [], [], []
+        self._buffered = 0
+
+    @classmethod
+    def load(cls, chunk_size=10_000, buffer_size=1_000_000):
+        property_ids = np.fromiter(
+            Property.objects.order_by("pk").values_list("pk", flat=True),
+            dtype=np.int64,
+        )
+        max_user_id = User.objects.aggregate(max_id=Max("pk"))["max_id"] or 0
+
+        interactions = cls(property_ids, max_user_id + 1, buffer_size)
+        if not len(property_ids):
+            return interactions
+        for model, weight in (
+            (BrowsingHistory, VIEW_WEIGHT),
+            (LikeHistory, LIKE_WEIGHT),
+        ):
+            rows = (
+                model.objects.filter(user_id__lte=max_user_id)
+                .values_list("user_id", "property_id")
+                .iterator(chunk_size=chunk_size)
+            )
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    interactions.add(chunk, weight)
+                    chunk = []
+            if chunk:
+                interactions.add(chunk, weight)
+        return interactions.finish()
+
+    def add(self, pairs, weight):
+        """
+        Buffer a chunk of (user id, property id) pairs.
+        """
+        pairs = np.array(pairs, dtype=np.int64)
+        columns = np.searchsorted(self.property_ids, pairs[:, 1])
+        columns = np.minimum(columns, len(self.property_ids) - 1)
+        # drop properties created after the ids were loaded
+        known = self.property_ids[columns] == pairs[:, 1]
+
+        self._rows.append(pairs[known, 0].astype(np.int32))
+        self._columns.append(columns[known].astype(np.int32))
+        self._weights.append(np.full(known.sum(), weight, dtype=np.float32))
+        self._buffered += len(pairs)
+        if self._buffered >= self.buffer_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        buffered = sparse.csr_matrix(
+            (
+                np.concatenate(self._weights),
+                (np.concatenate(self._rows), np.concatenate(self._columns)),
+            ),
+            shape=self.shape,
+        )
+        self.matrix = self.matrix + buffered
+        self._rows, self._columns, self._weights = [], [], []
+        self._buffered = 0
+
+    def finish(self):
+        self._flush()
+        return self
+
+    def get_normalized_columns(self):
+        """
+        Scale every property column to unit length, the product of two
+        columns is then their cosine similarity.
+        """
+        norms = np.sqrt(np.asarray(self.matrix.power(2).sum(axis=0)).ravel())
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return (self.matrix @ sparse.diags(scale.astype(np.float32))).tocsc()
+
+
+def get_top_neighbours(similarities, position, limit):
+    """
+    Top neighbours of one row of a CSR similarity block, excluding itself.
+
+    Returns:
+        tuple: (column indexes, scores) arrays, best match first.
+    """
+    start, end = similarities.indptr[position], similarities.indptr[position + 1]
+    columns = similarities.indices[start:end]
+    scores = similarities.data[start:end]
+    if len(scores) > limit:
+        keep = np.argpartition(-scores, limit)[: limit + 1]
+        columns, scores = columns[keep], scores[keep]
+    order = np.lexsort((columns, -scores))
+    return columns[order], scores[order]
+
+
+def compute_interaction_similarity(
+    interactions: InteractionMatrix,
+    block_size=500,
+    limit=INTERACTION_NEIGHBOURS_TOP_K,
+):
+    """
+    Store the top K item-item cosine neighbours of every property.
+
+    Similarities are computed for `block_size` properties at a time, which
+    bounds the memory of the (block x properties) product.
+
+    Returns:
+        int: the number of stored neighbour rows.
+    """
+    normalized = interactions.get_normalized_columns()
+    transposed = normalized.T.tocsr()
+    property_ids = interactions.property_ids
+    stored = 0
+
+    for start in range(0, len(property_ids), block_size):
+        end = min(start + block_size, len(property_ids))
+        similarities = (transposed[start:end] @ normalized).tocsr()
+
+        rows = []
+        for position in range(end - start):
+            columns, scores = get_top_neighbours(similarities, position, limit)
+            neighbours = [
+                (column, score)
+                for column, score in zip(columns, scores)
+                if column != start + position and score > 0
+            ][:limit]
+            rows.extend(
+                PropertySimilarity(
+                    source_id=int(property_ids[start + position]),
+                    similar_id=int(property_ids[column]),
+                    kind=INTERACTIONS,
+                    score=float(score),
+                    rank=rank,
+                )
+                for rank, (column, score) in enumerate(neighbours)
+            )
+
+        with transaction.atomic():
+            PropertySimilarity.objects.filter(
+                source_id__in=property_ids[start:end].tolist(), kind=INTERACTIONS
+            ).delete()
+            PropertySimilarity.objects.bulk_create(rows)
+        stored += len(rows)
+
+    return stored
@@ -0,0 +1,161 @@
+import bisect
+import heapq
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import PopularSearch
+from .workers import PeriodicWorker, process_singleton
+
+logger = logging.getLogger("app")
+
+# upper bounds of the searched price bands, in rupees
+PRICE_BANDS = (1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000)
+PRICE_BAND_LABELS = (
+    "Up to 10 Lakh",
+    "10 - 25 Lakh",
+    "25 - 50 Lakh",
+    "50 Lakh - 1 Crore",
+    "1 - 2.5 Crore",
+    "Above 2.5 Crore",
+)
+
+
+def get_price_band(price_min, price_max):
+    """
+    Label of the band of the highest price a search accepts.
+    """
+    price = price_max if price_max is not None else price_min
+    if price is None:
+        return None
+    return PRICE_BAND_LABELS[bisect.bisect_left(PRICE_BANDS, price)]
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitter sketch.
+
+    At most `capacity` values are counted. A new value replaces the value
+    with the lowest count and inherits that count as its error, so counts
+    overestimate by at most their error and every value seen more than
+    total / capacity times is always kept.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, value) of every counted value, counts are only refreshed
+        # when the entry reaches the top of the heap
+        self._heap = []
+
+    def add(self, value, count=1):
+        if value in self.counts:
+            self.counts[value] += count
+            return
+
+        error = self._evict() if len(self.counts) >= self.capacity else 0
+        self.counts[value] = error + count
+        self.errors[value] = error
+        heapq.heappush(self._heap, (error + count, value))
+
+    def _evict(self):
+        while True:
+            count, value = heapq.heappop(self._heap)
+            if self.counts[value] == count:
+                del self.counts[value]
+                del self.errors[value]
+                return count
+            heapq.heappush(self._heap, (self.counts[value], value))
+
+    def items(self):
+        """
+        Returns:
+            list: (value, count, error) tuples, highest count first.
+        """
+        return sorted(
+            (
+                (value, count, self.errors[value])
+                for value, count in self.counts.items()
+            ),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+
+class SearchTracker(PeriodicWorker):
+    """
+    Tracks the most searched locations, types, post types and price bands.
+
+    Every search is added to one Space-Saving sketch per day and search
+    field, so memory stays bounded whatever the number of searches. A
+    background thread adds the sketches to the `PopularSearch` rows every
+    `persist_interval` seconds and starts new ones.
+    """
+
+    thread_name = "search-tracker"
+
+    def __init__(self, capacity=200, persist_interval=60.0):
+        super().__init__(interval=persist_interval)
+        self.capacity = capacity
+        self.sketches = {}
+
+    def record(self, values):
+        """
+        Add a search, `values` are the normalized search history values.
+        """
+        day = timezone.localdate()
+        dimensions = {
+            PopularSearch.Dimension.LOCATION: values.get("location"),
+            PopularSearch.Dimension.TYPE: values.get("type"),
+            PopularSearch.Dimension.POST_TYPE: values.get("post_type"),
+            PopularSearch.Dimension.PRICE_BAND: get_price_band(
+                values.get("price_min"), values.get("price_max")
+            ),
+        }
+
+        self._start()
+        with self._lock:
+            for dimension, value in dimensions.items():
+                if not value:
+                    continue
+                sketch = self.sketches.get((day, dimension))
+                if sketch is None:
+                    sketch = self.sketches[day, dimension] = SpaceSaving(self.capacity)
+                sketch.add(value[:255])
+
+    def persist(self):
+        """
+        Add the sketches to the stored counts, returns the number of values.
+        """
+        with self._lock:
+            sketches, self.sketches = self.sketches, {}
+
+        counts = defaultdict(dict)
+        for (day, dimension), sketch in sketches.items():
+            for value, count, error in sketch.items():
+                counts[day][dimension, value] = (count, error)
+
+        try:
+            for day, day_counts in counts.items():
+                PopularSearch.increment(day, day_counts)
+        except DatabaseError:
+            logger.exception("Failed to persist the popular searches")
+            return 0
+        return sum(len(day_counts) for day_counts in counts.values())
+
+    def run_once(self):
+        self.persist()
+
+
+@process_singleton
+def get_search_tracker():
+    """
+    Return the search tracker of this process.
+    """
+    return SearchTracker(
+        capacity=settings.POPULAR_SEARCH_CAPACITY,
+        persist_interval=settings.POPULAR_SEARCH_PERSIST_INTERVAL,
+    )
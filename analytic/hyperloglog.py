@@ -0,0 +1,77 @@
+import hashlib
+import math
+import zlib
+
+# 2 ** HLL_PRECISION one byte registers per sketch
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+class HyperLogLog:
+    """
+    HyperLogLog estimate of the number of distinct values.
+
+    With 1024 registers the relative standard error is 1.04 / sqrt(1024),
+    about 3.3%, so 95% of estimates are within 6.5% of the exact count.
+    Below about 2.5k values linear counting is used, which is near exact
+    for the small daily audiences of a property. Sketches are merged by
+    taking the maximum of every register, merging the daily sketches of a
+    week estimates the distinct values of the week with the same error.
+    Stored sketches are zlib compressed, mostly empty sketches take a few
+    dozen bytes and full ones at most 1 KiB.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers or HLL_REGISTERS)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        return cls(zlib.decompress(data))
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers))
+
+    def add(self, value):
+        hashed = int.from_bytes(
+            hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big"
+        )
+        index = hashed >> (64 - HLL_PRECISION)
+        rest = hashed & ((1 << (64 - HLL_PRECISION)) - 1)
+        # position of the first set bit of the remaining hash bits
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+        estimate = (
+            alpha
+            * HLL_REGISTERS**2
+            / sum(2.0**-register for register in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return round(estimate)
+
+
+def merge_sketches(blobs):
+    """
+    Merge stored sketches into a single sketch.
+    """
+    sketch = HyperLogLog()
+    for blob in blobs:
+        if blob:
+            sketch.merge(HyperLogLog.from_bytes(blob))
+    return sketch
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytic.collaborative import (
+    INTERACTION_NEIGHBOURS_TOP_K,
+    InteractionMatrix,
+    compute_interaction_similarity,
+    sparse,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the top K item-item neighbours of every property from the "
+        "views and likes of all users"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="Number of history rows loaded per query",
+        )
+        parser.add_argument(
+            "--buffer-size",
+            type=int,
+            default=1_000_000,
+            help="Number of history rows buffered before folding them into the matrix",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=500,
+            help="Number of properties whose similarities are computed at once",
+        )
+
+    def handle(self, *args, **options):
+        if sparse is None:
+            raise CommandError("NumPy and SciPy are required to run this command")
+
+        interactions = InteractionMatrix.load(
+            chunk_size=options["chunk_size"], buffer_size=options["buffer_size"]
+        )
+        self.stdout.write(
+            f"Loaded {interactions.matrix.nnz} interactions of "
+            f"{interactions.shape[1]} properties"
+        )
+
+        stored = compute_interaction_similarity(
+            interactions, block_size=options["block_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {stored} neighbours, at most "
+                f"{INTERACTION_NEIGHBOURS_TOP_K} per property"
+            )
+        )
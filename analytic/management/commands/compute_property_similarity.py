@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from analytic.similarity import (
+    SIMILAR_PROPERTIES_TOP_K,
+    SimilarityCatalogue,
+    np,
+    store_similar_properties,
+)
+from property.models import Property
+
+
+class Command(BaseCommand):
+    help = "Recompute the top K similar properties of every property"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Number of properties recomputed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        property_ids = list(
+            Property.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        chunk_size = options["chunk_size"]
+
+        catalogue = None
+        if np is not None:
+            catalogue = SimilarityCatalogue.load()
+        else:
+            self.stdout.write("NumPy is not installed, scoring with SQL queries")
+
+        for start in range(0, len(property_ids), chunk_size):
+            store_similar_properties(
+                property_ids[start : start + chunk_size], catalogue=catalogue
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed the top {SIMILAR_PROPERTIES_TOP_K} similar properties "
+                f"of {len(property_ids)} properties"
+            )
+        )
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analytic.retention import RETENTION_TASKS, ArchiveWriter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact, archive and delete the analytic history older than the "
+        "ANALYTIC_RETENTION_DAYS windows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            action="append",
+            choices=list(RETENTION_TASKS),
+            help="Only prune this history table, may be repeated",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be compacted and deleted without writing",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows deleted per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between two deleted chunks",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            type=Path,
+            help="Write the deleted rows to compressed archives in this directory",
+        )
+        parser.add_argument(
+            "--format",
+            choices=ArchiveWriter.formats,
+            default="jsonl",
+            help="Archive file format",
+        )
+
+    def handle(self, *args, **options):
+        archive_dir = options["archive_dir"]
+        if archive_dir is not None and not archive_dir.is_dir():
+            raise CommandError(f"{archive_dir} is not a directory")
+
+        dry_run = options["dry_run"]
+        for name in options["table"] or RETENTION_TASKS:
+            days = settings.ANALYTIC_RETENTION_DAYS.get(name)
+            if days is None:
+                self.stdout.write(f"{name}: kept forever, skipping")
+                continue
+
+            task = RETENTION_TASKS[name](
+                days,
+                chunk_size=options["chunk_size"],
+                sleep=options["sleep"],
+                dry_run=dry_run,
+                log=self.stdout.write,
+            )
+            compacted, deleted = task.run(archive_dir, options["format"])
+
+            if dry_run:
+                summary = f"would compact {compacted} days and delete {deleted} rows"
+            else:
+                summary = f"compacted {compacted} days and deleted {deleted} rows"
+            self.stdout.write(
+                self.style.SUCCESS(f"{name}: {summary} older than {task.cutoff}")
+            )
@@ -0,0 +1,101 @@
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncDate
+
+from analytic.hyperloglog import HyperLogLog
+from analytic.models import (
+    BrowsingHistory,
+    LikeHistory,
+    PropertyDailyStats,
+    SiteDailyStats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily property stats and viewer sketches from the browsing "
+        "and like history. Days before the oldest remaining browsing history "
+        "are left alone, they only exist as rollups once pruned. History keeps "
+        "one view per user and day, so stored view counts are only raised"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of daily stats rows inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        start_day = BrowsingHistory.objects.aggregate(day=Min("day"))["day"]
+        if start_day is None:
+            self.stdout.write("No browsing history to rebuild the daily stats from")
+            return
+
+        counts = defaultdict(Counter)
+
+        viewers = (
+            BrowsingHistory.objects.values("property", "day")
+            .annotate(viewers=Count("user", distinct=True))
+            .values_list("property", "day", "viewers")
+        )
+        for property_id, day, count in viewers.iterator():
+            counts[property_id, day]["views"] += count
+            counts[property_id, day]["unique_viewers"] += count
+
+        history = (
+            BrowsingHistory.objects.order_by("property", "day")
+            .values_list("property", "day", "user")
+            .iterator()
+        )
+        site_sketches = defaultdict(HyperLogLog)
+        for (property_id, day), rows in groupby(
+            history, key=lambda row: (row[0], row[1])
+        ):
+            user_ids = [user_id for _, _, user_id in rows]
+            sketch = HyperLogLog().update(user_ids)
+            counts[property_id, day]["viewer_sketch"] = sketch.to_bytes()
+            site_sketches[day].merge(sketch)
+
+        likes = (
+            LikeHistory.objects.annotate(day=TruncDate("timestamp"))
+            .filter(day__gte=start_day)
+            .values("property", "day")
+            .annotate(likes=Count("pk"))
+            .values_list("property", "day", "likes")
+        )
+        for property_id, day, count in likes.iterator():
+            counts[property_id, day]["likes"] += count
+
+        with transaction.atomic():
+            stored_views = PropertyDailyStats.objects.filter(day__gte=start_day)
+            for property_id, day, views in stored_views.values_list(
+                "property", "day", "views"
+            ):
+                values = counts[property_id, day]
+                values["views"] = max(values["views"], views)
+
+            SiteDailyStats.objects.filter(day__gte=start_day).delete()
+            SiteDailyStats.objects.bulk_create(
+                SiteDailyStats(day=day, viewer_sketch=sketch.to_bytes())
+                for day, sketch in site_sketches.items()
+            )
+            stored_views.delete()
+            PropertyDailyStats.objects.bulk_create(
+                (
+                    PropertyDailyStats(property_id=property_id, day=day, **values)
+                    for (property_id, day), values in counts.items()
+                ),
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(counts)} daily property stats since {start_day}"
+            )
+        )
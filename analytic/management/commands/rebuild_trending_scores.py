@@ -0,0 +1,69 @@
+import math
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytic.models import PropertyDailyStats
+from analytic.retention import get_day_start
+from analytic.trending import TRENDING_WEIGHTS, get_event_score
+from property.models import Property
+from review.models import Review
+
+
+def log_add_exp(a, b):
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the trending score of every property from the daily stats "
+        "and the approved reviews, scores are updated as events arrive so "
+        "this is only needed to backfill them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of properties updated per query",
+        )
+
+    def handle(self, *args, **options):
+        scores = defaultdict(float)
+
+        def add(property_id, weight, timestamp):
+            if weight > 0:
+                scores[property_id] = log_add_exp(
+                    scores[property_id], get_event_score(weight, timestamp)
+                )
+
+        stats = PropertyDailyStats.objects.values_list(
+            "property_id", "day", "views", "likes"
+        )
+        for property_id, day, views, likes in stats.iterator():
+            timestamp = get_day_start(day)
+            add(property_id, views * TRENDING_WEIGHTS["view"], timestamp)
+            add(property_id, likes * TRENDING_WEIGHTS["like"], timestamp)
+
+        reviews = Review.objects.filter(
+            status=Review.StatusChoices.APPROVED
+        ).values_list("property_id", "created_at")
+        for property_id, created_at in reviews.iterator():
+            add(property_id, TRENDING_WEIGHTS["review"], created_at)
+
+        with transaction.atomic():
+            Property.objects.update(trending_score=0)
+            Property.objects.bulk_update(
+                [
+                    Property(pk=property_id, trending_score=score)
+                    for property_id, score in scores.items()
+                ],
+                ["trending_score"],
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt trending scores of {len(scores)} properties")
+        )
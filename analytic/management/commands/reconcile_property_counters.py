@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from analytic.models import LikeHistory, PropertyDailyStats
+from property.models import Property
+from review.models import Review
+
+
+def get_total(queryset, aggregate):
+    """
+    Correlated subquery of an aggregate over the rows of each property.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(property=OuterRef("pk"))
+            .order_by()
+            .values("property")
+            .annotate(total=aggregate)
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Repair the like, view and approved review counters of properties "
+        "that drifted from the history tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of properties checked per query",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the properties whose counters drifted",
+        )
+
+    def handle(self, *args, **options):
+        counters = {
+            "like_count": get_total(LikeHistory.objects.all(), Count("pk")),
+            "view_count": get_total(PropertyDailyStats.objects.all(), Sum("views")),
+            "approved_review_count": get_total(
+                Review.objects.filter(status=Review.StatusChoices.APPROVED),
+                Count("pk"),
+            ),
+        }
+        drifted = Q()
+        for field in counters:
+            drifted |= ~Q(**{field: F(f"expected_{field}")})
+
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                Property.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: options["chunk_size"]]
+            )
+            if not ids:
+                break
+
+            drifted_ids = list(
+                Property.objects.filter(pk__in=ids)
+                .annotate(
+                    **{
+                        f"expected_{field}": expression
+                        for field, expression in counters.items()
+                    }
+                )
+                .filter(drifted)
+                .values_list("pk", flat=True)
+            )
+            if drifted_ids and not options["dry_run"]:
+                # recounted in the update itself, so writes that happened
+                # since the check are not lost
+                Property.objects.filter(pk__in=drifted_ids).update(**counters)
+
+            checked += len(ids)
+            repaired += len(drifted_ids)
+            last_pk = ids[-1]
+
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {repaired} drifted counters in {checked} properties"
+            )
+        )
@@ -1,7 +1,18 @@
-from django.db import models
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 from accounts.models import User
-from property.models import Property
+from property.models import Property, PropertySearch
+
+from .hyperloglog import HyperLogLog, merge_sketches
 
 
 class BrowsingHistory(models.Model):
@@ -10,17 +21,42 @@ class BrowsingHistory(models.Model):
         Property, on_delete=models.CASCADE, related_name="browsing_stats"
     )
     timestamp = models.DateTimeField(auto_now_add=True)
+    day = models.DateField(default=timezone.localdate)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "property", "day"], name="unique_browsing_history"
+            ),
+        ]
         indexes = [
             models.Index(fields=["user", "-timestamp"]),
+            models.Index(fields=["day"]),
         ]
         verbose_name_plural = "Browsing History"
 
 
+# largest value of a PositiveIntegerField on every database
+RANGE_VALUE_MAX = 2147483647
+
+
 class SearchHistory(models.Model):
+    SIGNATURE_FIELDS = (
+        "query",
+        "location",
+        "price_min",
+        "price_max",
+        "type",
+        "post_type",
+        "area_min",
+        "area_max",
+    )
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+    hit_count = models.PositiveIntegerField(default=1)
+    signature = models.CharField(max_length=64, editable=False)
 
     query = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
@@ -31,14 +67,47 @@ class SearchHistory(models.Model):
     area_min = models.PositiveIntegerField(blank=True, null=True)
     area_max = models.PositiveIntegerField(blank=True, null=True)
 
+    @classmethod
+    def normalize(cls, values):
+        """
+        Clean search values so equivalent searches get the same signature:
+        text is lower cased with collapsed whitespace, ranges are whole
+        numbers and blank, invalid or out of range values are None.
+        """
+        normalized = {}
+        for field in cls.SIGNATURE_FIELDS:
+            value = values.get(field)
+            if field.endswith(("_min", "_max")):
+                try:
+                    value = (
+                        int(Decimal(str(value))) if value not in (None, "") else None
+                    )
+                except (InvalidOperation, OverflowError, ValueError):
+                    value = None
+                if value is not None and not 0 <= value <= RANGE_VALUE_MAX:
+                    value = None
+                normalized[field] = value
+            else:
+                normalized[field] = " ".join(str(value or "").lower().split()) or None
+        return normalized
+
+    @classmethod
+    def get_signature(cls, values):
+        """
+        Hash of the normalized search values.
+        """
+        payload = json.dumps([values.get(field) for field in cls.SIGNATURE_FIELDS])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "signature"], name="unique_search_history"
+            ),
+        ]
         indexes = [
-            models.Index(fields=["user", "-timestamp"]),
-            models.Index(fields=["location"]),
-            models.Index(fields=["type"]),
-            models.Index(fields=["post_type"]),
-            models.Index(fields=["price_min", "price_max"]),
-            models.Index(fields=["area_min", "area_max"]),
+            models.Index(fields=["user", "-last_seen"]),
+            models.Index(fields=["last_seen"]),
         ]
         verbose_name_plural = "Search History"
 
@@ -50,4 +119,337 @@ class LikeHistory(models.Model):
 
     class Meta:
         unique_together = ("user", "property")
+        indexes = [
+            models.Index(fields=["timestamp"]),
+        ]
         verbose_name_plural = "Like History"
+
+
+class PropertyDailyStats(models.Model):
+    """
+    Views, unique viewers and net likes of a property per day, incremented
+    by the view buffer and `UserActivity.like_property`.
+    """
+
+    property = models.ForeignKey(
+        Property, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    # HyperLogLog sketch of the viewer ids, see analytic.hyperloglog
+    viewer_sketch = models.BinaryField(null=True)
+
+    @classmethod
+    def increment(cls, counts):
+        """
+        Add to the counters of many (property, day) rows, creating missing rows.
+
+        Args:
+            counts: Mapping of (property id, day) to a mapping of field to delta.
+        """
+        if not counts:
+            return
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(property_id=property_id, day=day) for property_id, day in counts],
+                ignore_conflicts=True,
+            )
+            for (property_id, day), deltas in counts.items():
+                cls.objects.filter(property_id=property_id, day=day).update(
+                    **{field: F(field) + delta for field, delta in deltas.items()}
+                )
+
+    @classmethod
+    def get_top_viewed(cls, days=7, limit=5, queryset=None):
+        """
+        Ids of the most viewed properties over the last `days` days.
+
+        Returns:
+            list: (property id, views) tuples, most viewed first.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        since = timezone.localdate() - timedelta(days=days - 1)
+        return list(
+            queryset.filter(day__gte=since)
+            .values("property")
+            .annotate(total=Sum("views"))
+            .order_by("-total", "property")
+            .values_list("property", "total")[:limit]
+        )
+
+    @classmethod
+    def add_viewers(cls, viewers):
+        """
+        Add viewers to the sketches of many existing (property, day) rows.
+
+        Args:
+            viewers: Mapping of (property id, day) to the viewer user ids.
+        """
+        if not viewers:
+            return
+
+        with transaction.atomic():
+            rows = (
+                cls.objects.select_for_update()
+                .filter(
+                    property_id__in={property_id for property_id, _ in viewers},
+                    day__in={day for _, day in viewers},
+                )
+                .only("pk", "property_id", "day", "viewer_sketch")
+            )
+            updated = []
+            for row in rows:
+                user_ids = viewers.get((row.property_id, row.day))
+                if user_ids:
+                    sketch = HyperLogLog.from_bytes(row.viewer_sketch)
+                    row.viewer_sketch = sketch.update(user_ids).to_bytes()
+                    updated.append(row)
+            cls.objects.bulk_update(updated, ["viewer_sketch"])
+
+    @classmethod
+    def get_unique_viewers(cls, days=7, queryset=None):
+        """
+        Estimate the distinct viewers over the last `days` days, a viewer of
+        several properties of the queryset counts once.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        since = timezone.localdate() - timedelta(days=days - 1)
+        return merge_sketches(
+            queryset.filter(day__gte=since)
+            .exclude(viewer_sketch=None)
+            .values_list("viewer_sketch", flat=True)
+            .iterator()
+        ).count()
+
+    @classmethod
+    def get_totals(cls, days=30, queryset=None):
+        """
+        Sum the counters over the last `days` days.
+
+        Returns:
+            dict: views, unique_viewers and likes.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        since = timezone.localdate() - timedelta(days=days - 1)
+        totals = queryset.filter(day__gte=since).aggregate(
+            views=Sum("views"),
+            unique_viewers=Sum("unique_viewers"),
+            likes=Sum("likes"),
+        )
+        return {field: total or 0 for field, total in totals.items()}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["property", "day"], name="unique_property_daily_stats"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day", "property", "views"]),
+        ]
+        verbose_name_plural = "Property Daily Stats"
+
+
+class SiteDailyStats(models.Model):
+    """
+    Sketch of the distinct viewers of any property per day.
+    """
+
+    day = models.DateField(unique=True)
+    viewer_sketch = models.BinaryField(null=True)
+
+    @classmethod
+    def add_viewers(cls, viewers):
+        """
+        Args:
+            viewers: Mapping of day to the viewer user ids.
+        """
+        if not viewers:
+            return
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(day=day) for day in viewers], ignore_conflicts=True
+            )
+            updated = []
+            for row in cls.objects.select_for_update().filter(day__in=viewers):
+                sketch = HyperLogLog.from_bytes(row.viewer_sketch)
+                row.viewer_sketch = sketch.update(viewers[row.day]).to_bytes()
+                updated.append(row)
+            cls.objects.bulk_update(updated, ["viewer_sketch"])
+
+    @classmethod
+    def get_unique_viewers(cls, days=7):
+        """
+        Estimate the distinct viewers of the site over the last `days` days.
+        """
+        since = timezone.localdate() - timedelta(days=days - 1)
+        return merge_sketches(
+            cls.objects.filter(day__gte=since)
+            .exclude(viewer_sketch=None)
+            .values_list("viewer_sketch", flat=True)
+        ).count()
+
+    class Meta:
+        verbose_name_plural = "Site Daily Stats"
+
+
+class SearchDailyStats(models.Model):
+    """
+    Number of searches per day and search terms, kept after the search
+    history rows are pruned.
+    """
+
+    day = models.DateField()
+    query = models.CharField(max_length=255, blank=True, default="")
+    location = models.CharField(max_length=100, blank=True, default="")
+    type = models.CharField(max_length=100, blank=True, default="")
+    post_type = models.CharField(max_length=100, blank=True, default="")
+    searches = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "query", "location", "type", "post_type"],
+                name="unique_search_daily_stats",
+            ),
+        ]
+        verbose_name_plural = "Search Daily Stats"
+
+
+class PopularSearch(models.Model):
+    """
+    Approximate number of searches per day of the most searched values of
+    a search field, persisted from the heavy hitter sketches.
+    """
+
+    class Dimension(models.TextChoices):
+        LOCATION = "location"
+        TYPE = "type"
+        POST_TYPE = "post_type"
+        PRICE_BAND = "price_band"
+
+    day = models.DateField()
+    dimension = models.CharField(max_length=20, choices=Dimension.choices)
+    value = models.CharField(max_length=255)
+    # count overestimates the searches by at most error
+    count = models.PositiveIntegerField(default=0)
+    error = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def increment(cls, day, counts):
+        """
+        Add sketch counts to the rows of a day, creating missing rows.
+
+        Args:
+            counts: Mapping of (dimension, value) to a (count, error) tuple.
+        """
+        if not counts:
+            return
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [
+                    cls(day=day, dimension=dimension, value=value)
+                    for dimension, value in counts
+                ],
+                ignore_conflicts=True,
+            )
+            for (dimension, value), (count, error) in counts.items():
+                cls.objects.filter(day=day, dimension=dimension, value=value).update(
+                    count=F("count") + count, error=F("error") + error
+                )
+
+    @classmethod
+    def get_top(cls, dimension, days=7, limit=10):
+        """
+        Most searched values of a dimension over the last `days` days.
+
+        Returns:
+            list: (value, count) tuples, most searched first.
+        """
+        since = timezone.localdate() - timedelta(days=days - 1)
+        return list(
+            cls.objects.filter(dimension=dimension, day__gte=since)
+            .values("value")
+            .annotate(total=Sum("count"))
+            .order_by("-total", "value")
+            .values_list("value", "total")[:limit]
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "dimension", "value"], name="unique_popular_search"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["dimension", "day"]),
+        ]
+
+
+class PropertySimilarity(models.Model):
+    """
+    Precomputed top K similar properties of every property.
+
+    Attribute similarity is filled by the `compute_property_similarity`
+    command and refreshed when properties change, interaction similarity is
+    filled by the `compute_interaction_similarity` batch job.
+    """
+
+    class Kind(models.TextChoices):
+        ATTRIBUTES = "attributes"
+        INTERACTIONS = "interactions"
+
+    source = models.ForeignKey(
+        Property, on_delete=models.CASCADE, related_name="similar_properties"
+    )
+    similar = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(
+        choices=Kind.choices, max_length=20, default=Kind.ATTRIBUTES
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "similar", "kind"],
+                name="unique_property_similarity",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["source", "kind", "rank"]),
+        ]
+        verbose_name_plural = "Property Similarities"
+
+
+@receiver(post_save, sender=PropertySearch)
+def _property_search_post_save_receiver(
+    sender, instance: PropertySearch, *args, **kwargs
+):
+    from .similarity import SIMILARITY_FIELDS, get_similarity_refresher
+
+    # the row is saved on every property and details save, most of them
+    # leave the similarity features alone
+    if not instance.has_changed(SIMILARITY_FIELDS):
+        return
+    refresher = get_similarity_refresher()
+    transaction.on_commit(lambda: refresher.add_changed(instance.pk))
+
+
+@receiver(pre_delete, sender=Property)
+def _property_pre_delete_receiver(sender, instance: Property, *args, **kwargs):
+    from .similarity import get_similarity_refresher
+
+    source_ids = list(
+        PropertySimilarity.objects.filter(
+            similar=instance, kind=PropertySimilarity.Kind.ATTRIBUTES
+        ).values_list("source_id", flat=True)
+    )
+    if source_ids:
+        refresher = get_similarity_refresher()
+        transaction.on_commit(lambda: refresher.add_sources(source_ids))
@@ -0,0 +1,245 @@
+import datetime
+import gzip
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.export import EXPORT_FORMATS, RowEncoder
+
+from .models import (
+    BrowsingHistory,
+    LikeHistory,
+    PopularSearch,
+    PropertyDailyStats,
+    SearchDailyStats,
+    SearchHistory,
+    SiteDailyStats,
+)
+
+
+class ArchiveWriter:
+    """
+    Append rows to a gzip compressed JSONL or CSV file.
+    """
+
+    formats = EXPORT_FORMATS
+
+    def __init__(self, path, fields, format="jsonl"):
+        self.path = path
+        self.encoder = RowEncoder(fields, format)
+        self.file = gzip.open(path, "wt", newline="")
+        self.file.write(self.encoder.header())
+
+    def write(self, rows):
+        self.file.write(self.encoder.encode(rows))
+
+    def close(self):
+        self.file.close()
+
+
+def get_day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class RetentionTask:
+    """
+    Prunes the rows of a history table older than its retention window.
+
+    Rows are compacted into aggregate tables one day at a time, then
+    optionally archived and deleted in small primary key chunks so every
+    write transaction stays short.
+    """
+
+    name = None
+    model = None
+    date_field = "timestamp"
+
+    def __init__(self, days, chunk_size=1000, sleep=0, dry_run=False, log=None):
+        self.days = days
+        self.chunk_size = chunk_size
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.log = log or (lambda message: None)
+
+    @property
+    def cutoff(self):
+        return timezone.localdate() - datetime.timedelta(days=self.days)
+
+    @property
+    def fields(self):
+        return [field.attname for field in self.model._meta.concrete_fields]
+
+    def get_expired(self):
+        if self.date_field == "day":
+            return self.model.objects.filter(day__lt=self.cutoff)
+        return self.model.objects.filter(
+            **{f"{self.date_field}__lt": get_day_start(self.cutoff)}
+        )
+
+    def get_expired_days(self):
+        queryset = self.get_expired()
+        if self.date_field != "day":
+            queryset = queryset.annotate(day=TruncDate(self.date_field))
+        return list(queryset.values_list("day", flat=True).distinct().order_by("day"))
+
+    def compact_day(self, day):
+        """
+        Fold the rows of a day into the aggregate tables, must be idempotent
+        as a day may be compacted again after an interrupted run.
+        """
+
+    def compact(self):
+        days = self.get_expired_days()
+        for index, day in enumerate(days, start=1):
+            if not self.dry_run:
+                with transaction.atomic():
+                    self.compact_day(day)
+            action = "would compact" if self.dry_run else "compacted"
+            self.log(f"{self.name}: {action} {day} ({index}/{len(days)})")
+        return len(days)
+
+    def delete(self, archive=None):
+        expired = self.get_expired()
+        if self.dry_run:
+            return expired.count()
+
+        deleted = 0
+        while True:
+            ids = list(
+                expired.order_by("pk").values_list("pk", flat=True)[: self.chunk_size]
+            )
+            if not ids:
+                break
+
+            if archive is not None:
+                archive.write(
+                    self.model.objects.filter(pk__in=ids)
+                    .order_by("pk")
+                    .values(*self.fields)
+                )
+            self.model.objects.filter(pk__in=ids).delete()
+
+            deleted += len(ids)
+            self.log(f"{self.name}: deleted {deleted} rows")
+            if self.sleep:
+                time.sleep(self.sleep)
+        return deleted
+
+    def run(self, archive_dir=None, archive_format="jsonl"):
+        """
+        Returns:
+            tuple: (compacted days, deleted rows), what would be done in dry-run.
+        """
+        compacted = self.compact()
+
+        archive = None
+        if archive_dir and not self.dry_run:
+            path = archive_dir / (
+                f"{self.name}-{timezone.now():%Y%m%d%H%M%S}.{archive_format}.gz"
+            )
+            archive = ArchiveWriter(path, self.fields, archive_format)
+        try:
+            deleted = self.delete(archive)
+        finally:
+            if archive is not None:
+                archive.close()
+                self.log(f"{self.name}: archived to {archive.path}")
+        return compacted, deleted
+
+
+class BrowsingRetentionTask(RetentionTask):
+    name = "browsing"
+    model = BrowsingHistory
+    date_field = "day"
+
+    def compact_day(self, day):
+        # views are rolled up as they are recorded, only fill in the days
+        # recorded before the rollup existed
+        PropertyDailyStats.objects.bulk_create(
+            [
+                PropertyDailyStats(
+                    property_id=property_id,
+                    day=day,
+                    views=viewers,
+                    unique_viewers=viewers,
+                )
+                for property_id, viewers in BrowsingHistory.objects.filter(day=day)
+                .values("property")
+                .annotate(viewers=Count("user", distinct=True))
+                .values_list("property", "viewers")
+            ],
+            ignore_conflicts=True,
+        )
+
+        # adding viewers to a sketch again does not change it
+        viewers = defaultdict(set)
+        site_viewers = set()
+        for property_id, user_id in BrowsingHistory.objects.filter(day=day).values_list(
+            "property", "user"
+        ):
+            viewers[property_id, day].add(user_id)
+            site_viewers.add(user_id)
+        if site_viewers:
+            PropertyDailyStats.add_viewers(viewers)
+            SiteDailyStats.add_viewers({day: site_viewers})
+
+
+class SearchRetentionTask(RetentionTask):
+    name = "search"
+    model = SearchHistory
+    date_field = "last_seen"
+
+    def compact_day(self, day):
+        if SearchDailyStats.objects.filter(day=day).exists():
+            return
+
+        fields = ("query", "location", "type", "post_type")
+        rows = (
+            SearchHistory.objects.filter(
+                last_seen__gte=get_day_start(day),
+                last_seen__lt=get_day_start(day + datetime.timedelta(days=1)),
+            )
+            .values_list(*fields)
+            .annotate(searches=Sum("hit_count"))
+            .order_by()
+        )
+
+        # blank and missing values are stored the same way
+        searches = Counter()
+        for *values, count in rows:
+            searches[tuple(value or "" for value in values)] += count
+
+        SearchDailyStats.objects.bulk_create(
+            [
+                SearchDailyStats(day=day, searches=count, **dict(zip(fields, values)))
+                for values, count in searches.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class LikeRetentionTask(RetentionTask):
+    name = "likes"
+    model = LikeHistory
+
+
+class PopularSearchRetentionTask(RetentionTask):
+    # the rows are already daily aggregates
+    name = "popular_search"
+    model = PopularSearch
+    date_field = "day"
+
+
+RETENTION_TASKS = {
+    task.name: task
+    for task in (
+        BrowsingRetentionTask,
+        SearchRetentionTask,
+        LikeRetentionTask,
+        PopularSearchRetentionTask,
+    )
+}
@@ -0,0 +1,352 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, F, FloatField, Min, Q, Value
+from django.db.models.functions import Abs, Cast
+
+from property.models import PropertySearch
+
+from .models import PropertySimilarity
+from .workers import PeriodicWorker, process_singleton
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger("app")
+
+# number of similar properties stored per property
+SIMILAR_PROPERTIES_TOP_K = 20
+
+# search row fields the similarity of a property depends on
+SIMILARITY_FIELDS = ("price", "post_type", "city", "state", "postal_code", "type_id")
+
+ATTRIBUTES = PropertySimilarity.Kind.ATTRIBUTES
+
+
+def get_similarity_filter(search: PropertySearch):
+    """
+    Properties sharing the post type, city, state, postal code or type of a
+    search row are candidates for being similar to it.
+    """
+    filters = (
+        Q(post_type=search.post_type)
+        | Q(city=search.city)
+        | Q(state=search.state)
+        | Q(postal_code=search.postal_code)
+    )
+    if search.type_id:
+        filters |= Q(type_id=search.type_id)
+    return filters
+
+
+def get_price_distance(search: PropertySearch):
+    return Abs(F("price") - Value(search.price))
+
+
+def price_distance_to_score(distance):
+    return 1 / (float(distance) + 1)
+
+
+def find_similar_properties(search: PropertySearch, limit=SIMILAR_PROPERTIES_TOP_K):
+    """
+    Rank the properties similar to a search row, the closer the price the
+    more similar.
+
+    Returns:
+        list: (property id, score) tuples, best match first.
+    """
+    if search.price is None:
+        return []
+
+    candidates = (
+        PropertySearch.objects.filter(get_similarity_filter(search))
+        .exclude(pk=search.pk)
+        .filter(price__isnull=False)
+        .annotate(price_distance=get_price_distance(search))
+        .order_by("price_distance", "pk")
+        .values_list("pk", "price_distance")[:limit]
+    )
+    return [(pk, price_distance_to_score(distance)) for pk, distance in candidates]
+
+
+class SimilarityCatalogue:
+    """
+    The similarity features of every priced property held in NumPy arrays,
+    sorted by id, so a property is scored against the whole catalogue with a
+    few vectorized operations instead of a query.
+
+    Text columns are encoded as integer codes, the catalogue takes about 30
+    bytes per property.
+    """
+
+    def __init__(self, ids, prices, post_types, cities, states, postal_codes, types):
+        self.ids = ids
+        self.prices = prices
+        self.post_types = post_types
+        self.cities = cities
+        self.states = states
+        self.postal_codes = postal_codes
+        self.types = types
+
+    @classmethod
+    def load(cls, chunk_size=2000):
+        columns = [[] for _ in range(7)]
+        codes = [{} for _ in range(4)]
+
+        rows = (
+            PropertySearch.objects.filter(price__isnull=False)
+            .order_by("pk")
+            .values_list(
+                "pk",
+                "price",
+                "post_type",
+                "city",
+                "state",
+                "postal_code",
+                "type_id",
+            )
+        )
+        for pk, price, *values, type_id in rows.iterator(chunk_size=chunk_size):
+            columns[0].append(pk)
+            columns[1].append(price)
+            for index, (value, lowercase) in enumerate(
+                zip(values, (False, True, True, False))
+            ):
+                value = (value or "").lower() if lowercase else value
+                columns[index + 2].append(
+                    codes[index].setdefault(value, len(codes[index]))
+                )
+            columns[6].append(-1 if type_id is None else type_id)
+
+        return cls(
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype=np.float64),
+            *(np.array(column, dtype=np.int32) for column in columns[2:6]),
+            np.array(columns[6], dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, pk):
+        """
+        Index of a property in the arrays, or None if it is not in the catalogue.
+        """
+        position = int(np.searchsorted(self.ids, pk))
+        if position < len(self.ids) and self.ids[position] == pk:
+            return position
+        return None
+
+    def find_similar_properties(self, pk, limit=SIMILAR_PROPERTIES_TOP_K):
+        """
+        Same ranking as `find_similar_properties`, computed over the arrays.
+
+        Returns:
+            list: (property id, score) tuples, best match first.
+        """
+        position = self.position(pk)
+        if position is None:
+            return []
+
+        mask = (
+            (self.post_types == self.post_types[position])
+            | (self.cities == self.cities[position])
+            | (self.states == self.states[position])
+            | (self.postal_codes == self.postal_codes[position])
+        )
+        if self.types[position] != -1:
+            mask |= self.types == self.types[position]
+        mask[position] = False
+
+        candidates = np.flatnonzero(mask)
+        distances = np.abs(self.prices[candidates] - self.prices[position])
+        if len(candidates) > limit:
+            # keep everything tied with the last place so ties are broken by
+            # id exactly like the SQL ordering
+            kth = np.partition(distances, limit - 1)[limit - 1]
+            keep = distances <= kth
+            candidates, distances = candidates[keep], distances[keep]
+
+        order = np.lexsort((self.ids[candidates], distances))[:limit]
+        return [
+            (int(pk), price_distance_to_score(distance))
+            for pk, distance in zip(self.ids[candidates[order]], distances[order])
+        ]
+
+
+def store_similar_properties(source_ids, catalogue=None):
+    """
+    Recompute and replace the similar properties of the given properties,
+    using the catalogue arrays when given.
+    """
+    rows = []
+    if catalogue is not None:
+        similar_properties = (
+            (pk, catalogue.find_similar_properties(pk)) for pk in source_ids
+        )
+    else:
+        similar_properties = (
+            (search.pk, find_similar_properties(search))
+            for search in PropertySearch.objects.select_related("property").filter(
+                pk__in=source_ids
+            )
+        )
+    for source_id, similar in similar_properties:
+        rows.extend(
+            PropertySimilarity(
+                source_id=source_id,
+                similar_id=pk,
+                kind=ATTRIBUTES,
+                score=score,
+                rank=rank,
+            )
+            for rank, (pk, score) in enumerate(similar)
+        )
+
+    with transaction.atomic():
+        PropertySimilarity.objects.filter(
+            source_id__in=source_ids, kind=ATTRIBUTES
+        ).delete()
+        PropertySimilarity.objects.bulk_create(rows)
+
+
+def get_affected_sources(search: PropertySearch):
+    """
+    Ids of the properties whose stored list the given search row now enters.
+
+    Similarity is symmetric, so a property belongs in another one's list when
+    it matches it and scores above the lowest stored entry, or the list is not
+    full. Properties without any stored list are left to the offline job. The
+    stored lists are compared in a single grouped query, only the ids of the
+    affected lists are loaded.
+    """
+    if search.price is None:
+        return []
+
+    matching = (
+        PropertySearch.objects.filter(get_similarity_filter(search))
+        .exclude(pk=search.pk)
+        .filter(price__isnull=False)
+    )
+    distance = Abs(F("source__search__price") - Value(search.price))
+    score = Value(1.0) / (Cast(distance, FloatField()) + Value(1.0))
+    return list(
+        PropertySimilarity.objects.filter(
+            source_id__in=matching.values("pk"), kind=ATTRIBUTES
+        )
+        .values("source_id", "source__search__price")
+        .annotate(count=Count("pk"), min_score=Min("score"))
+        .filter(Q(count__lt=SIMILAR_PROPERTIES_TOP_K) | Q(min_score__lt=score))
+        .values_list("source_id", flat=True)
+    )
+
+
+def get_refreshed_sources(property_id):
+    """
+    Ids of the lists to recompute after a property changed: its own list, the
+    lists it used to appear in and the lists it now enters.
+    """
+    source_ids = {property_id}
+    source_ids.update(
+        PropertySimilarity.objects.filter(
+            similar_id=property_id, kind=ATTRIBUTES
+        ).values_list("source_id", flat=True)
+    )
+
+    search = PropertySearch.objects.filter(pk=property_id).first()
+    if search is not None:
+        source_ids.update(get_affected_sources(search))
+    return source_ids
+
+
+def refresh_similar_properties(property_id):
+    """
+    Incrementally update the similarity table after a property changed.
+    """
+    store_similar_properties(get_refreshed_sources(property_id))
+
+
+class SimilarityRefresher(PeriodicWorker):
+    """
+    Refreshes the similar properties of changed properties in the background.
+
+    Requests only add the ids of the changed properties and of the lists to
+    recompute to in-memory sets, so a property saved several times by one
+    request or by the listing wizard is refreshed once. A background thread
+    refreshes them every `refresh_interval` seconds and once more when the
+    process exits. Ids lost with a crashed process are fixed by the next
+    `compute_property_similarity` run.
+    """
+
+    thread_name = "similarity-refresher"
+
+    def __init__(self, refresh_interval=30.0):
+        super().__init__(interval=refresh_interval)
+        self.changed_ids = set()
+        self.source_ids = set()
+        self._local = threading.local()
+
+    def add_changed(self, property_id):
+        """
+        Queue a property whose similarity features changed.
+        """
+        if getattr(self._local, "suspended", False):
+            return
+        self._start()
+        with self._lock:
+            self.changed_ids.add(property_id)
+
+    def add_sources(self, source_ids):
+        """
+        Queue lists to recompute, e.g. the lists a deleted property was in.
+        """
+        if getattr(self._local, "suspended", False):
+            return
+        self._start()
+        with self._lock:
+            self.source_ids.update(source_ids)
+
+    @contextmanager
+    def suspended(self):
+        """
+        Ignore the changes of the current thread, for bulk rebuilds followed
+        by `compute_property_similarity`.
+        """
+        self._local.suspended = True
+        try:
+            yield
+        finally:
+            self._local.suspended = False
+
+    def refresh(self):
+        """
+        Recompute the queued lists, returns the number of recomputed lists.
+        """
+        with self._lock:
+            changed_ids, self.changed_ids = self.changed_ids, set()
+            source_ids, self.source_ids = self.source_ids, set()
+
+        try:
+            for property_id in changed_ids:
+                source_ids.update(get_refreshed_sources(property_id))
+            store_similar_properties(source_ids)
+        except DatabaseError:
+            logger.exception("Failed to refresh the similar properties")
+            return 0
+        return len(source_ids)
+
+    def run_once(self):
+        self.refresh()
+
+
+@process_singleton
+def get_similarity_refresher():
+    """
+    Return the similarity refresher of this process.
+    """
+    return SimilarityRefresher(refresh_interval=settings.SIMILARITY_REFRESH_INTERVAL)
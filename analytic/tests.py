@@ -1,3 +1,305 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import math
+import random
+import tempfile
+from collections import Counter
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from property.models import Property, PropertyType
+
+from .buffer import SearchEventBuffer
+from .heavy_hitters import SpaceSaving
+from .hyperloglog import HyperLogLog, merge_sketches
+from .models import (
+    BrowsingHistory,
+    PropertyDailyStats,
+    SearchDailyStats,
+    SearchHistory,
+)
+from .retention import get_day_start
+from .trending import (
+    TRENDING_HALF_LIFE,
+    TRENDING_WEIGHTS,
+    add_trending_event,
+    get_event_score,
+)
+from .workers import PeriodicWorker, process_singleton
+
+
+def create_property(user, name):
+    return Property.objects.create(
+        user=user,
+        name=name,
+        post_type="Sale",
+        type=PropertyType.objects.get_or_create(name="House")[0],
+        description=name,
+        phone="1",
+        state="Telangana",
+        city="Hyderabad",
+        address="1 Main Road",
+        postal_code="500001",
+        is_rera_agent=False,
+    )
+
+
+class FailingWorker(PeriodicWorker):
+    def __init__(self):
+        super().__init__(interval=60)
+        self.runs = 0
+
+    def run_once(self):
+        self.runs += 1
+        raise ValueError("bad batch")
+
+
+class PeriodicWorkerTests(SimpleTestCase):
+    def test_errors_are_logged_and_the_worker_keeps_running(self):
+        worker = FailingWorker()
+        with self.assertLogs("app", level="ERROR"):
+            worker._run_logged()
+            worker._run_logged()
+        self.assertEqual(worker.runs, 2)
+
+    def test_close_runs_a_last_time(self):
+        worker = FailingWorker()
+        with self.assertLogs("app", level="ERROR"):
+            worker.close()
+        self.assertEqual(worker.runs, 1)
+
+    def test_process_singleton(self):
+        get_worker = process_singleton(FailingWorker)
+        self.assertIs(get_worker(), get_worker())
+
+
+class SpaceSavingTests(SimpleTestCase):
+    def test_exact_under_capacity(self):
+        sketch = SpaceSaving(3)
+        for value in "abacab":
+            sketch.add(value)
+        self.assertEqual(sketch.items(), [("a", 3, 0), ("b", 2, 0), ("c", 1, 0)])
+
+    def test_eviction_replaces_the_lowest_count(self):
+        sketch = SpaceSaving(2)
+        sketch.add("a", 5)
+        sketch.add("b", 2)
+        sketch.add("c")
+        self.assertEqual(sketch.items(), [("a", 5, 0), ("c", 3, 2)])
+
+    def test_error_bound(self):
+        rng = random.Random(0)
+        values = [min(int(rng.paretovariate(1.2)), 500) for _ in range(20000)]
+        capacity = 50
+        sketch = SpaceSaving(capacity)
+        for value in values:
+            sketch.add(value)
+
+        true_counts = Counter(values)
+        items = sketch.items()
+        self.assertEqual(len(items), capacity)
+        for value, count, error in items:
+            self.assertGreaterEqual(count, true_counts[value])
+            self.assertLessEqual(count - error, true_counts[value])
+            self.assertLessEqual(error, len(values) / capacity)
+        # every value seen more than total / capacity times is kept
+        kept = {value for value, count, error in items}
+        for value, count in true_counts.items():
+            if count > len(values) / capacity:
+                self.assertIn(value, kept)
+
+
+class SearchHistoryTests(TestCase):
+    def test_equivalent_searches_share_a_signature(self):
+        first = SearchHistory.normalize(
+            {"location": "  New   Delhi ", "price_min": "100000.50", "type": ""}
+        )
+        second = SearchHistory.normalize({"location": "new delhi", "price_min": 100000})
+        self.assertEqual(first, second)
+        self.assertEqual(
+            SearchHistory.get_signature(first), SearchHistory.get_signature(second)
+        )
+
+        other = SearchHistory.normalize({"location": "new delhi", "price_min": 200000})
+        self.assertNotEqual(
+            SearchHistory.get_signature(first), SearchHistory.get_signature(other)
+        )
+
+    def test_repeated_search_bumps_the_hit_count(self):
+        user = User.objects.create(email="searcher@example.com", username="searcher")
+        buffer = SearchEventBuffer()
+        buffer.record(user.pk, SearchHistory.normalize({"location": "Pune"}))
+        buffer.record(user.pk, SearchHistory.normalize({"location": " PUNE "}))
+        self.assertEqual(buffer.flush(), 1)
+
+        buffer.record(user.pk, SearchHistory.normalize({"location": "pune"}))
+        self.assertEqual(buffer.flush(), 0)
+
+        search = SearchHistory.objects.get(user=user)
+        self.assertEqual(search.location, "pune")
+        self.assertEqual(search.hit_count, 3)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_error(self):
+        for distinct in (10, 1000, 50_000):
+            sketch = HyperLogLog().update(range(distinct))
+            # repeated values do not change the estimate
+            sketch.update(range(distinct // 2))
+            self.assertLess(abs(sketch.count() - distinct) / distinct, 0.1)
+
+    def test_small_counts_are_near_exact(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+        self.assertEqual(HyperLogLog().update(range(20)).count(), 20)
+
+    def test_merge(self):
+        first = HyperLogLog().update(range(0, 30_000))
+        second = HyperLogLog().update(range(20_000, 50_000))
+        merged = HyperLogLog().merge(first).merge(second)
+        self.assertLess(abs(merged.count() - 50_000) / 50_000, 0.1)
+        union = HyperLogLog().update(range(50_000))
+        self.assertEqual(merged.registers, union.registers)
+
+    def test_bytes_round_trip(self):
+        sketch = HyperLogLog().update(f"user-{i}" for i in range(5000))
+        data = sketch.to_bytes()
+        self.assertLessEqual(len(data), 1024 + 16)
+        restored = HyperLogLog.from_bytes(data)
+        self.assertEqual(restored.registers, sketch.registers)
+        self.assertEqual(restored.count(), sketch.count())
+        self.assertEqual(HyperLogLog.from_bytes(None).count(), 0)
+        self.assertEqual(merge_sketches([data, None]).registers, sketch.registers)
+
+
+class PruneAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.old_day = timezone.localdate() - datetime.timedelta(days=400)
+        cls.today = timezone.localdate()
+        owner = User.objects.create(email="owner@example.com", username="owner")
+        cls.users = [
+            User.objects.create(email=f"user{i}@example.com", username=f"user{i}")
+            for i in range(2)
+        ]
+        cls.property = create_property(owner, "Lake view")
+        for user in cls.users:
+            BrowsingHistory.objects.create(
+                user=user, property=cls.property, day=cls.old_day
+            )
+        BrowsingHistory.objects.create(
+            user=cls.users[0], property=cls.property, day=cls.today
+        )
+        SearchHistory.objects.create(
+            user=cls.users[0],
+            signature="old",
+            location="hyderabad",
+            hit_count=3,
+            last_seen=get_day_start(cls.old_day),
+        )
+        SearchHistory.objects.create(
+            user=cls.users[0], signature="new", location="pune"
+        )
+
+    def prune(self, *args):
+        call_command(
+            "prune_analytics",
+            "--table",
+            "browsing",
+            "--table",
+            "search",
+            *args,
+            stdout=StringIO(),
+        )
+
+    def test_dry_run_writes_nothing(self):
+        self.prune("--dry-run")
+        self.assertEqual(BrowsingHistory.objects.count(), 3)
+        self.assertEqual(SearchHistory.objects.count(), 2)
+        self.assertFalse(PropertyDailyStats.objects.exists())
+        self.assertFalse(SearchDailyStats.objects.exists())
+
+    def test_expired_rows_are_compacted_and_archived(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self.prune("--archive-dir", archive_dir)
+            archived = {}
+            for path in Path(archive_dir).iterdir():
+                with gzip.open(path, "rt") as file:
+                    archived[path.name.split("-")[0]] = [
+                        json.loads(line) for line in file
+                    ]
+
+        self.assertEqual(
+            list(BrowsingHistory.objects.values_list("day", flat=True)), [self.today]
+        )
+        self.assertEqual(
+            list(SearchHistory.objects.values_list("location", flat=True)), ["pune"]
+        )
+
+        stats = PropertyDailyStats.objects.get(day=self.old_day)
+        self.assertEqual((stats.views, stats.unique_viewers), (2, 2))
+        search_stats = SearchDailyStats.objects.get(day=self.old_day)
+        self.assertEqual(
+            (search_stats.location, search_stats.searches), ("hyderabad", 3)
+        )
+
+        self.assertEqual(
+            sorted(row["user_id"] for row in archived["browsing"]),
+            sorted(user.pk for user in self.users),
+        )
+        self.assertEqual([row["location"] for row in archived["search"]], ["hyderabad"])
+
+
+class TrendingTests(TestCase):
+    now = datetime.datetime(2026, 6, 1, tzinfo=datetime.timezone.utc)
+
+    def test_event_score(self):
+        score = get_event_score(1, self.now)
+        self.assertAlmostEqual(get_event_score(3, self.now) - score, math.log(3))
+        # an event is worth half as much one half life later
+        self.assertAlmostEqual(
+            get_event_score(1, self.now + TRENDING_HALF_LIFE) - score, math.log(2)
+        )
+
+    def test_recent_events_rank_higher(self):
+        owner = User.objects.create(email="owner@example.com", username="owner")
+        old, recent, liked = (create_property(owner, name) for name in "abc")
+
+        # three views two half lives ago are worth 0.75 of a view now
+        for _ in range(3):
+            self.add(old, "view", self.now - 2 * TRENDING_HALF_LIFE)
+        self.add(recent, "view", self.now)
+        self.add(liked, "like", self.now - TRENDING_HALF_LIFE)
+
+        self.assertEqual(
+            list(Property.objects.order_by("-trending_score")), [liked, recent, old]
+        )
+        old.refresh_from_db()
+        self.assertAlmostEqual(
+            old.trending_score,
+            get_event_score(0.75, self.now),
+        )
+
+    def test_large_timestamps_do_not_overflow(self):
+        owner = User.objects.create(email="owner@example.com", username="owner")
+        property = create_property(owner, "far future")
+        future = self.now.replace(year=2200)
+        self.add(property, "review", future)
+        self.add(property, "review", future)
+
+        property.refresh_from_db()
+        self.assertTrue(math.isfinite(property.trending_score))
+        self.assertAlmostEqual(
+            property.trending_score,
+            get_event_score(2 * TRENDING_WEIGHTS["review"], future),
+        )
+
+    def add(self, property, event, timestamp):
+        Property.objects.filter(pk=property.pk).update(
+            trending_score=add_trending_event(TRENDING_WEIGHTS[event], timestamp)
+        )
@@ -0,0 +1,46 @@
+import datetime
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+# event weights, a like or an approved review says more than a view
+TRENDING_WEIGHTS = {"view": 1.0, "like": 3.0, "review": 5.0}
+
+# the weight of an event halves every TRENDING_HALF_LIFE
+TRENDING_HALF_LIFE = datetime.timedelta(days=3)
+DECAY_RATE = math.log(2) / TRENDING_HALF_LIFE.total_seconds()
+
+# scores are relative to a fixed epoch, it must never change once scores
+# are stored
+TRENDING_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_event_score(weight, timestamp=None):
+    """
+    Log of the forward decayed weight of an event.
+
+    Instead of decaying every stored score as time passes, events are
+    boosted by exp(DECAY_RATE * age of the epoch). The ratio between two
+    scores is then the same as with their decayed values, so ordering by
+    the stored score ranks by current trend without ever rewriting it. The
+    boosted values overflow floats within years, so they are kept as logs.
+    """
+    timestamp = timestamp or timezone.now()
+    return math.log(weight) + DECAY_RATE * (
+        (timestamp - TRENDING_EPOCH).total_seconds()
+    )
+
+
+def add_trending_event(weight, timestamp=None):
+    """
+    Expression adding an event to the stored `trending_score`, to be used
+    in a queryset update so concurrent events are never lost.
+
+    Returns:
+        The log-sum-exp of the stored score and the event score.
+    """
+    score = F("trending_score")
+    event = Value(get_event_score(weight, timestamp), output_field=FloatField())
+    return Greatest(score, event) + Ln(1 + Exp(-Abs(score - event)))
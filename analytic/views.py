@@ -1,33 +1,90 @@
+import time
+
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F, Max, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 from accounts.models import User
+from property.fulltext import get_fulltext_backend
 from property.models import Property
 
-from .models import BrowsingHistory, LikeHistory, SearchHistory
+from .buffer import get_search_buffer, get_view_buffer
+from .heavy_hitters import get_search_tracker
+from .models import (
+    BrowsingHistory,
+    LikeHistory,
+    PropertyDailyStats,
+    PropertySimilarity,
+    SearchHistory,
+)
+from .trending import TRENDING_WEIGHTS, add_trending_event
 
 
 class UserActivity:
     def __init__(self, user: User):
         self.user = user
 
-    @transaction.atomic
     def record_property_view(self, property):
-        try:
-            BrowsingHistory.objects.get_or_create(user=self.user, property=property)
-        except Exception:
-            pass
+        """
+        Queue the view on the write-behind buffer, the history row is written
+        by its flusher thread outside of the request.
+        """
+        if self.user.pk is None:
+            return
+        get_view_buffer().record(self.user.pk, property.pk)
 
     def record_search(self, **kwargs):
-        SearchHistory.objects.get_or_create(user=self.user, **kwargs)
+        """
+        Queue the search on the write-behind buffer, repeating a search only
+        bumps its hit count when the buffer is flushed.
+        """
+        if self.user.pk is None:
+            return
+        values = SearchHistory.normalize(kwargs)
+        if not any(values.values()):
+            return
+        get_search_tracker().record(values)
+        get_search_buffer().record(self.user.pk, values)
 
     @transaction.atomic
     def like_property(self, property):
-        try:
-            like = LikeHistory.objects.get(user=self.user, property=property)
-            like.delete()
-        except LikeHistory.DoesNotExist:
+        deleted, _ = LikeHistory.objects.filter(
+            user=self.user, property=property
+        ).delete()
+        if deleted:
+            delta = -1
+            trending = {}
+        else:
             LikeHistory.objects.create(user=self.user, property=property)
+            delta = 1
+            trending = {"trending_score": add_trending_event(TRENDING_WEIGHTS["like"])}
+        Property.objects.filter(pk=property.pk).update(
+            like_count=Greatest(F("like_count") + delta, 0), **trending
+        )
+        PropertyDailyStats.increment(
+            {(property.pk, timezone.localdate()): {"likes": delta}}
+        )
+        PropertyRecommender.invalidate(self.user.pk)
+
+    def get_liked_property_ids(self, property_ids):
+        """
+        Resolve which of the given properties the user liked in a single query.
+
+        Args:
+            property_ids: Ids of the properties rendered on the page.
+
+        Returns:
+            A set with the ids of the liked properties.
+        """
+        if not self.user.is_authenticated or not property_ids:
+            return set()
+        return set(
+            LikeHistory.objects.filter(
+                user=self.user, property_id__in=property_ids
+            ).values_list("property_id", flat=True)
+        )
 
     def get_recent_browsing(self, limit=10):
         return BrowsingHistory.objects.filter(user=self.user).order_by("-timestamp")[
@@ -35,7 +92,7 @@ class UserActivity:
         ]
 
     def get_recent_search(self, limit=10):
-        return SearchHistory.objects.filter(user=self.user).order_by("-timestamp")[
+        return SearchHistory.objects.filter(user=self.user).order_by("-last_seen")[
             :limit
         ]
 
@@ -43,14 +100,46 @@ class UserActivity:
 class PropertyRecommender:
     """
     Recommends properties to users based on their activity history.
+
+    The ranked ids are cached per user. New activity bumps the user's cache
+    version, the next request holding the refresh lock recomputes the ranking
+    while concurrent requests keep serving the stale one.
     """
 
+    # seconds a ranking is served without recomputing
+    cache_timeout = 15 * 60
+    # seconds an outdated ranking may still be served during a refresh
+    stale_timeout = 24 * 60 * 60
+    refresh_lock_timeout = 30
+
+    # weight of every kind of stored similarity when blending them
+    similarity_weights = {
+        PropertySimilarity.Kind.ATTRIBUTES: 1.0,
+        PropertySimilarity.Kind.INTERACTIONS: 1.0,
+    }
+
     def __init__(self, user: User):
         self.user = user
 
+    @staticmethod
+    def get_version_key(user_id):
+        return f"recommendations-version:{user_id}"
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """
+        Mark the cached recommendations of a user as outdated once the current
+        transaction commits.
+        """
+        if user_id is None:
+            return
+        transaction.on_commit(
+            lambda: cache.set(cls.get_version_key(user_id), time.time_ns(), None)
+        )
+
     def get_recommendations(self, top_n=5):
         """
-        Fetches and ranks property recommendations for the user.
+        Fetches the ranked property recommendations for the user.
 
         Args:
             top_n: The number of recommendations to return.
@@ -59,6 +148,53 @@ class PropertyRecommender:
             A list of recommended Property objects, ranked by relevance.
         """
 
+        top_ids = self.get_cached_recommended_ids(top_n)
+        properties = Property.objects.for_cards().in_bulk(top_ids)
+        return [properties[pk] for pk in top_ids if pk in properties]
+
+    def get_cached_recommended_ids(self, top_n=5):
+        """
+        Returns the cached ranking, recomputing it when missing or outdated.
+        """
+        if self.user.pk is None:
+            return self.get_recommended_ids(top_n)
+
+        cache_key = f"recommendations:{self.user.pk}:{top_n}"
+        lock_key = f"{cache_key}:lock"
+        version_key = self.get_version_key(self.user.pk)
+        cached = cache.get_many([cache_key, version_key])
+        version = cached.get(version_key)
+        entry = cached.get(cache_key)
+
+        locked = False
+        if entry is not None:
+            if entry["version"] == version and entry["expires"] > time.time():
+                return entry["ids"]
+            locked = cache.add(lock_key, True, self.refresh_lock_timeout)
+            if not locked:
+                return entry["ids"]
+
+        try:
+            ids = self.get_recommended_ids(top_n)
+            cache.set(
+                cache_key,
+                {
+                    "version": version,
+                    "expires": time.time() + self.cache_timeout,
+                    "ids": ids,
+                },
+                self.stale_timeout,
+            )
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return ids
+
+    def get_recommended_ids(self, top_n=5):
+        """
+        Ranks the ids of the recommended properties.
+        """
+
         recommendations = self._get_browsing_history_recommendations()
         recommendations.update(self._get_liked_history_recommendations())
         recommendations.update(self._get_search_history_recommendations())
@@ -66,52 +202,52 @@ class PropertyRecommender:
         sorted_recommendations = sorted(
             recommendations.items(), key=lambda item: item[1], reverse=True
         )
-        return [prop for prop, _ in sorted_recommendations][:top_n]
-
-    def _get_browsing_history_recommendations(self):
-        """Recommends properties similar to recently browsed ones."""
+        return [pk for pk, _ in sorted_recommendations][:top_n]
 
-        recent_browsing = BrowsingHistory.objects.filter(user=self.user).order_by(
-            "-timestamp"
-        )[:5]
+    def _get_similar_recommendations(self, property_ids):
+        """Sums the weighted similarity scores of properties similar to these ones."""
 
         recommendations = {}
-        for browsing in recent_browsing:
-            similar_properties = self._find_similar_properties(browsing.property)
-            for prop, score in similar_properties.items():
-                recommendations[prop] = recommendations.get(prop, 0) + score
+        for pk, kind, score in PropertySimilarity.objects.filter(
+            source_id__in=property_ids
+        ).values_list("similar_id", "kind", "score"):
+            score *= self.similarity_weights.get(kind, 1.0)
+            recommendations[pk] = recommendations.get(pk, 0) + score
         return recommendations
 
+    def _get_browsing_history_recommendations(self):
+        """Recommends properties similar to recently browsed ones."""
+
+        # a property is browsed again on later days, rank it by its last view
+        recent_browsing = (
+            BrowsingHistory.objects.filter(user=self.user)
+            .values("property_id")
+            .annotate(last_viewed=Max("timestamp"))
+            .order_by("-last_viewed")
+            .values_list("property_id", flat=True)[:5]
+        )
+        return self._get_similar_recommendations(list(recent_browsing))
+
     def _get_liked_history_recommendations(self):
         """Recommends properties similar to liked ones."""
 
         liked_properties = LikeHistory.objects.filter(user=self.user).values_list(
             "property", flat=True
         )
-
-        recommendations = {}
-        for property_id in liked_properties:
-            similar_properties = self._find_similar_properties(
-                Property.objects.get(pk=property_id)
-            )
-            for prop, score in similar_properties.items():
-                recommendations[prop] = recommendations.get(prop, 0) + score
-        return recommendations
+        return self._get_similar_recommendations(list(liked_properties))
 
     def _get_search_history_recommendations(self):
         """Recommends properties based on recent search queries."""
 
         recent_searches = SearchHistory.objects.filter(user=self.user).order_by(
-            "-timestamp"
+            "-last_seen"
         )[:3]
 
         recommendations = {}
         for search in recent_searches:
             filters = Q()
             if search.query:
-                filters |= Q(name__icontains=search.query) | Q(
-                    description__icontains=search.query
-                )
+                filters |= get_fulltext_backend().filter_q(search.query)
             if search.type:
                 filters |= Q(type__name__icontains=search.type)
             if search.post_type:
@@ -120,37 +256,14 @@ class PropertyRecommender:
                 filters |= (
                     Q(state__icontains=search.location)
                     | Q(city__icontains=search.location)
-                    | Q(lat__icontains=search.location)
-                    | Q(long__icontains=search.location)
                     | Q(address__icontains=search.location)
                     | Q(postal_code__icontains=search.location)
                 )
             if search.price_min:
-                filters |= Q(price__gte=search.price_min)
+                filters |= Q(search__price__gte=search.price_min)
             if search.price_max:
-                filters |= Q(price__lte=search.price_max)
+                filters |= Q(search__price__lte=search.price_max)
 
-            properties = Property.objects.filter(filters)
-            for prop in properties:
-                recommendations[prop] = recommendations.get(prop, 0) + 1
+            for pk in Property.objects.filter(filters).values_list("pk", flat=True):
+                recommendations[pk] = recommendations.get(pk, 0) + 1
         return recommendations
-
-    def _find_similar_properties(self, property: Property):
-        """Finds properties similar to a given property based on city, state, type, post_type and price."""
-
-        similar_properties = {}
-        filters = (
-            Q(type__name__icontains=property.type.name)
-            | Q(post_type__icontains=property.post_type)
-            | Q(city__icontains=property.city)
-            | Q(state__icontains=property.state)
-            | Q(postal_code__icontains=property.postal_code)
-        )
-        similar_qs = Property.objects.filter(filters).exclude(pk=property.pk)
-
-        for prop in similar_qs:
-            score = 1
-            price_diff = abs(property.details.price - prop.details.price)
-            score *= 1 / (price_diff + 1)
-            similar_properties[prop] = score
-        return similar_properties
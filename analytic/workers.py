@@ -0,0 +1,79 @@
+import atexit
+import functools
+import logging
+import threading
+
+from django.db import connection
+
+logger = logging.getLogger("app")
+
+
+class PeriodicWorker:
+    """
+    Base of the background workers of a process.
+
+    `run_once` is called by a daemon thread every `interval` seconds and
+    once more when the process exits. The thread is started by the first
+    `_start` call. Errors are logged and the thread keeps running, so one
+    bad batch never stops the worker for the life of the process.
+    """
+
+    thread_name = "periodic-worker"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+        self._run_logged()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.thread_name, daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self._run_logged()
+            finally:
+                connection.close()
+
+    def _run_logged(self):
+        try:
+            self.run_once()
+        except Exception:
+            logger.exception(f"Background worker {self.thread_name} failed")
+
+
+def process_singleton(factory):
+    """
+    Make a factory return the same instance for the whole process, it is
+    created on the first call.
+    """
+    instances = []
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get_instance():
+        if not instances:
+            with lock:
+                if not instances:
+                    instances.append(factory())
+        return instances[0]
+
+    return get_instance
@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from accounts.models import User
+from analytic.models import BrowsingHistory, LikeHistory, SearchHistory
+from property.models import Property
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def get_model_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+# exported tables, users leave out their password and payment ids
+EXPORTS = {
+    "browsing_history": (BrowsingHistory, get_model_fields(BrowsingHistory)),
+    "search_history": (SearchHistory, get_model_fields(SearchHistory)),
+    "likes": (LikeHistory, get_model_fields(LikeHistory)),
+    "users": (
+        User,
+        [
+            "id",
+            "email",
+            "username",
+            "first_name",
+            "last_name",
+            "phone",
+            "company",
+            "is_active",
+            "is_staff",
+            "is_superuser",
+            "is_verified",
+            "date_joined",
+            "last_login",
+        ],
+    ),
+    "properties": (Property, get_model_fields(Property)),
+}
+
+
+class RowEncoder:
+    """
+    Encode rows as CSV or JSON lines text.
+    """
+
+    def __init__(self, fields, format="csv"):
+        self.fields = fields
+        self.format = format
+        self.buffer = io.StringIO()
+        self.writer = None
+        if format == "csv":
+            self.writer = csv.DictWriter(self.buffer, fieldnames=fields)
+
+    def header(self):
+        if self.writer is None:
+            return ""
+        self.writer.writeheader()
+        return self._read()
+
+    def encode(self, rows):
+        for row in rows:
+            if self.writer is not None:
+                self.writer.writerow(row)
+            else:
+                self.buffer.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+        return self._read()
+
+    def _read(self):
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+def iter_chunks(queryset, fields, chunk_size=1000):
+    """
+    Read the rows of a queryset as lists of dicts, in primary key order.
+
+    Every chunk is a short query starting after the last read key, so a
+    large table is read with constant memory and without a long running
+    cursor or transaction.
+    """
+    last_pk = None
+    while True:
+        chunk = queryset.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values("pk", *fields)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            last_pk = row.pop("pk")
+        yield rows
+
+
+class Export:
+    """
+    Iterable of the encoded bytes of a queryset export.
+
+    Args:
+        queryset: The rows to export.
+        fields: Exported field names, in column order.
+        name: Base name of the exported file, the model name by default.
+        format: One of EXPORT_FORMATS.
+        compress: Whether to gzip the output on the fly.
+        chunk_size: Number of rows read per query.
+    """
+
+    def __init__(
+        self,
+        queryset,
+        fields,
+        name=None,
+        format="csv",
+        compress=False,
+        chunk_size=1000,
+    ):
+        self.queryset = queryset
+        self.fields = fields
+        self.name = name or queryset.model._meta.model_name
+        self.format = format
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.count = 0
+
+    @classmethod
+    def for_table(cls, name, **kwargs):
+        model, fields = EXPORTS[name]
+        return cls(model.objects.all(), fields, name=name, **kwargs)
+
+    @property
+    def filename(self):
+        return f"{self.name}.{self.format}" + (".gz" if self.compress else "")
+
+    @property
+    def content_type(self):
+        if self.compress:
+            return "application/gzip"
+        return EXPORT_CONTENT_TYPES[self.format]
+
+    def __iter__(self):
+        # wbits 31 writes a gzip header and trailer
+        compressor = zlib.compressobj(wbits=31) if self.compress else None
+        encoder = RowEncoder(self.fields, self.format)
+
+        def encode(text):
+            data = text.encode()
+            return compressor.compress(data) if compressor else data
+
+        yield encode(encoder.header())
+        for rows in iter_chunks(self.queryset, self.fields, self.chunk_size):
+            self.count += len(rows)
+            yield encode(encoder.encode(rows))
+        if compressor:
+            yield compressor.flush()
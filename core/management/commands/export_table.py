@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.export import EXPORT_FORMATS, EXPORTS, Export
+
+
+class Command(BaseCommand):
+    help = "Export a table as CSV or JSON lines, reading it in primary key chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=EXPORTS)
+        parser.add_argument(
+            "--format",
+            choices=EXPORT_FORMATS,
+            default="csv",
+            help="Format of the exported rows",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress the export with gzip",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="File to write the export to, standard output by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows loaded per query",
+        )
+
+    def handle(self, *args, **options):
+        export = Export.for_table(
+            options["table"],
+            format=options["format"],
+            compress=options["gzip"],
+            chunk_size=options["chunk_size"],
+        )
+
+        if options["output"] is None:
+            for data in export:
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as file:
+            for data in export:
+                file.write(data)
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {export.count} rows to {options['output']}")
+        )
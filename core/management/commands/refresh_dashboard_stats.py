@@ -0,0 +1,35 @@
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import DashboardStats, MonthlyUserJoins, get_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the admin dashboard snapshot and the user joins of the "
+        "current month, counts are otherwise kept up to date by signals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=1,
+            help="Number of months of user joins to recount, the current one first",
+        )
+
+    def handle(self, *args, **options):
+        stats, _ = DashboardStats.objects.get_or_create(pk=1)
+        stats.refresh()
+
+        current_month = get_month(timezone.now())
+        for months in range(1, options["months"]):
+            MonthlyUserJoins.refresh(current_month - relativedelta(months=months))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {stats.user_count} users, {stats.property_count} "
+                f"properties and {stats.type_count} types"
+            )
+        )
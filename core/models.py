@@ -1,5 +1,62 @@
-from django.db import models
+import copy
+import datetime
+import time
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.forms import ValidationError
+from django.utils import timezone
+
+from accounts.models import User
+from property.models import Property, PropertyType
+
+from .page_cache import invalidate_cached_pages
+from .utils import get_date_range
+
+SINGLETON_VERSION_KEY = "singletons:version"
+# bounds how long a process may serve stale singletons when a change did not
+# reach its cache
+SINGLETON_VERSION_TIMEOUT = 5 * 60
+
+# process-local copies of the singletons, model -> (version, instance)
+_singletons = {}
+
+
+def load_singleton(model):
+    """
+    Return the singleton instance of a model from process memory.
+
+    The copies are tagged with a version stamp kept in the shared cache,
+    saving any singleton changes the stamp so every process loads them
+    again. A steady-state load costs one cache read and no query. The stamp
+    expires after SINGLETON_VERSION_TIMEOUT and a new one is then set, so
+    even a process that misses a change, e.g. with a per-process cache
+    backend, loads the singletons again within that time.
+    """
+    version = cache.get(SINGLETON_VERSION_KEY)
+    if version is None:
+        cache.add(SINGLETON_VERSION_KEY, time.time_ns(), SINGLETON_VERSION_TIMEOUT)
+        version = cache.get(SINGLETON_VERSION_KEY)
+
+    cached = _singletons.get(model)
+    if cached is None or cached[0] != version:
+        instance, _ = model.objects.get_or_create(pk=1)
+        cached = _singletons[model] = (version, instance)
+    # callers may change the instance before saving it
+    return copy.copy(cached[1])
+
+
+def invalidate_singletons():
+    transaction.on_commit(
+        lambda: cache.set(
+            SINGLETON_VERSION_KEY, time.time_ns(), SINGLETON_VERSION_TIMEOUT
+        )
+    )
 
 
 class BasePage(models.Model):
@@ -14,8 +71,7 @@ class BasePage(models.Model):
     @classmethod
     def load(self):
         """Helper to get the singleton instance."""
-        obj, created = self.objects.get_or_create(pk=1)
-        return obj
+        return load_singleton(self)
 
 
 # site settings & pages CMS
@@ -50,8 +106,7 @@ class SiteSettings(models.Model):
     @classmethod
     def load(self):
         """Helper to get the singleton instance."""
-        obj, created = self.objects.get_or_create(pk=1)
-        return obj
+        return load_singleton(self)
 
     class Meta:
         verbose_name_plural = "Site Settings"
@@ -77,8 +132,7 @@ class ContactInfo(models.Model):
     @classmethod
     def load(self):
         """Helper to get the singleton instance."""
-        obj, created = self.objects.get_or_create(pk=1)
-        return obj
+        return load_singleton(self)
 
     class Meta:
         verbose_name_plural = "Contact Info"
@@ -144,3 +198,148 @@ class ContactUs(models.Model):
 
     class Meta:
         verbose_name_plural = "Contact Us"
+
+
+def get_month(value):
+    """
+    First day of the local month of a datetime.
+    """
+    return timezone.localtime(value).date().replace(day=1)
+
+
+class DashboardStats(models.Model):
+    """
+    Snapshot of the admin dashboard counts, kept up to date by signals and
+    recounted by the refresh_dashboard_stats command.
+    """
+
+    user_count = models.PositiveIntegerField(default=0)
+    property_count = models.PositiveIntegerField(default=0)
+    type_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True)
+
+    @classmethod
+    def load(cls):
+        """
+        Helper to get the snapshot, counted with the joins of every charted
+        month when it is first created.
+        """
+        stats, created = cls.objects.get_or_create(pk=1)
+        if created:
+            stats.refresh()
+            MonthlyUserJoins.refresh_range(*get_date_range())
+        return stats
+
+    @classmethod
+    def increment(cls, field, delta):
+        cls.objects.filter(pk=1).update(**{field: Greatest(F(field) + delta, 0)})
+
+    def refresh(self):
+        """
+        Recount every snapshot count and the joins of the current month.
+        """
+        for model, field in DASHBOARD_COUNTED_MODELS.items():
+            setattr(self, field, model.objects.count())
+        self.refreshed_at = timezone.now()
+        self.save()
+        MonthlyUserJoins.refresh(get_month(self.refreshed_at))
+
+    class Meta:
+        verbose_name_plural = "Dashboard Stats"
+
+
+# counted models and their snapshot field
+DASHBOARD_COUNTED_MODELS = {
+    User: "user_count",
+    Property: "property_count",
+    PropertyType: "type_count",
+}
+
+
+class MonthlyUserJoins(models.Model):
+    """
+    Number of users who joined per month, the first day of the month.
+    """
+
+    month = models.DateField(unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def increment(cls, month, delta):
+        with transaction.atomic():
+            cls.objects.get_or_create(month=month)
+            cls.objects.filter(month=month).update(
+                count=Greatest(F("count") + delta, 0)
+            )
+
+    @classmethod
+    def refresh(cls, month):
+        """
+        Recount the joins of a single month.
+        """
+        start = timezone.make_aware(datetime.datetime.combine(month, datetime.time.min))
+        count = User.objects.filter(
+            date_joined__gte=start, date_joined__lt=start + relativedelta(months=1)
+        ).count()
+        cls.objects.update_or_create(month=month, defaults={"count": count})
+
+    @classmethod
+    def refresh_range(cls, start_date, end_date):
+        """
+        Recount the joins of every month in a date range.
+        """
+        month = start_date.replace(day=1)
+        while month <= end_date:
+            cls.refresh(month)
+            month += relativedelta(months=1)
+
+    @classmethod
+    def get_series(cls, start_date, end_date):
+        """
+        Returns:
+            dict: month to number of joins, for the months stored in the range.
+        """
+        return dict(
+            cls.objects.filter(
+                month__gte=start_date.replace(day=1), month__lte=end_date
+            ).values_list("month", "count")
+        )
+
+    class Meta:
+        verbose_name_plural = "Monthly User Joins"
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_save, sender=ContactInfo)
+@receiver(post_save, sender=AboutUs)
+@receiver(post_save, sender=TermsAndCondition)
+@receiver(post_save, sender=PrivacyPolicy)
+def _singleton_post_save_receiver(sender, *args, **kwargs):
+    invalidate_singletons()
+    invalidate_cached_pages()
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def _faq_receiver(sender, *args, **kwargs):
+    invalidate_cached_pages()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=PropertyType)
+def _counted_post_save_receiver(sender, instance, created, *args, **kwargs):
+    if not created:
+        return
+    DashboardStats.increment(DASHBOARD_COUNTED_MODELS[sender], 1)
+    if sender is User:
+        MonthlyUserJoins.increment(get_month(instance.date_joined), 1)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=PropertyType)
+def _counted_post_delete_receiver(sender, instance, *args, **kwargs):
+    DashboardStats.increment(DASHBOARD_COUNTED_MODELS[sender], -1)
+    if sender is User:
+        MonthlyUserJoins.increment(get_month(instance.date_joined), -1)
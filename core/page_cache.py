@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+
+PAGE_CACHE_VERSION_KEY = "pages:version"
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# rendered in place of the csrf token, every response gets its own token
+CSRF_TOKEN_PLACEHOLDER = "cachedpagecsrftokenplaceholder"
+
+
+def invalidate_cached_pages():
+    transaction.on_commit(
+        lambda: cache.set(PAGE_CACHE_VERSION_KEY, time.time_ns(), None)
+    )
+
+
+def is_anonymous_request(request):
+    """
+    Whether a request is anonymous, without loading its session.
+
+    Without a session cookie the user can only be anonymous. Requests with
+    pending messages are not served from the cache so they are shown.
+    """
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve the whole response of a page to anonymous users from the cache.
+
+    Entries are tagged with a version stamp which is changed whenever a
+    page model is saved, see `invalidate_cached_pages`, so a cached page
+    costs a single cache read and no query. Responses carry an ETag and a
+    Last-Modified date and conditional requests of an unchanged page get a
+    304. The csrf token of the login forms is replaced per response. Only
+    use it on pages which do not depend on the query string.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not is_anonymous_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        # the pages do not read the query string, keying on it would let any
+        # ?random=... request add an entry and render the page again
+        key = "page:" + hashlib.md5(request.path.encode()).hexdigest()
+        cached = cache.get_many([PAGE_CACHE_VERSION_KEY, key])
+        version = cached.get(PAGE_CACHE_VERSION_KEY)
+        if version is None:
+            cache.add(PAGE_CACHE_VERSION_KEY, time.time_ns(), None)
+            version = cache.get(PAGE_CACHE_VERSION_KEY)
+
+        entry = cached.get(key)
+        if entry is None or entry["version"] != version:
+            self.page_cache_render = True
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if hasattr(response, "render"):
+                response.render()
+            content = response.content.decode(response.charset)
+            entry = {
+                "version": version,
+                "content": content,
+                "content_type": response["Content-Type"],
+                "etag": '"%s"' % hashlib.md5(content.encode()).hexdigest(),
+                "last_modified": int(time.time()),
+            }
+            cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=entry["etag"], last_modified=entry["last_modified"]
+        )
+        if response is None:
+            response = HttpResponse(
+                entry["content"].replace(CSRF_TOKEN_PLACEHOLDER, get_token(request)),
+                content_type=entry["content_type"],
+            )
+        response["ETag"] = entry["etag"]
+        response["Last-Modified"] = http_date(entry["last_modified"])
+        # the page holds a token tied to the csrf cookie of the user
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Cookie"])
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(self, "page_cache_render", False):
+            context["csrf_token"] = CSRF_TOKEN_PLACEHOLDER
+        return context
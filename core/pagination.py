@@ -0,0 +1,204 @@
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+CURSOR_SALT = "core.pagination.cursor"
+
+
+class CursorSerializer(signing.JSONSerializer):
+    """
+    JSON serializer accepting the Decimal/datetime values of sort keys.
+    """
+
+    def dumps(self, obj):
+        return DjangoJSONEncoder(separators=(",", ":")).encode(obj).encode("latin-1")
+
+
+class CursorPage:
+    """
+    A page of results delimited by opaque cursors instead of page numbers.
+    """
+
+    def __init__(
+        self,
+        object_list,
+        next_cursor=None,
+        previous_cursor=None,
+        total_count=None,
+    ):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_count = total_count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over a single sort key with the primary key as tie breaker.
+
+    Every page is fetched with `WHERE (key, pk) > (last key, last pk) LIMIT n`,
+    so deep pages cost the same as the first one and no `COUNT(*)` or `OFFSET`
+    is issued. NULL sort keys are ordered last in both directions.
+    """
+
+    def __init__(self, queryset, per_page, key="pk", descending=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key = key
+        self.descending = descending
+
+    @staticmethod
+    def encode_cursor(value, pk, backwards=False):
+        return signing.dumps(
+            [value, pk, backwards], salt=CURSOR_SALT, serializer=CursorSerializer
+        )
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Returns:
+            tuple: (value, pk, backwards), or None for a missing/invalid cursor.
+        """
+        if not cursor:
+            return None
+        try:
+            value, pk, backwards = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        return value, pk, backwards
+
+    def _beyond(self, lookup, descending):
+        return f"{lookup}__lt" if descending else f"{lookup}__gt"
+
+    def _after(self, value, pk):
+        """Rows after (value, pk) in forward order."""
+        pk_after = Q(**{self._beyond("pk", self.descending): pk})
+        if self.key == "pk":
+            return pk_after
+        if value is None:
+            return Q(_cursor_key__isnull=True) & pk_after
+        return (
+            Q(**{self._beyond("_cursor_key", self.descending): value})
+            | (Q(_cursor_key=value) & pk_after)
+            | Q(_cursor_key__isnull=True)
+        )
+
+    def _before(self, value, pk):
+        """Rows before (value, pk) in forward order."""
+        pk_before = Q(**{self._beyond("pk", not self.descending): pk})
+        if self.key == "pk":
+            return pk_before
+        if value is None:
+            return Q(_cursor_key__isnull=False) | (
+                Q(_cursor_key__isnull=True) & pk_before
+            )
+        return Q(**{self._beyond("_cursor_key", not self.descending): value}) | (
+            Q(_cursor_key=value) & pk_before
+        )
+
+    def _ordering(self, backwards):
+        descending = self.descending != backwards
+        pk = "-pk" if descending else "pk"
+        if self.key == "pk":
+            return [pk]
+
+        # walking backwards reverses the whole ordering, NULLs included
+        nulls = {"nulls_first": True} if backwards else {"nulls_last": True}
+        key = F("_cursor_key")
+        return [key.desc(**nulls) if descending else key.asc(**nulls), pk]
+
+    def _cursor_for(self, obj, backwards=False):
+        value = obj.pk if self.key == "pk" else getattr(obj, "_cursor_key")
+        return self.encode_cursor(value, obj.pk, backwards)
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset
+        if self.key != "pk":
+            queryset = queryset.annotate(_cursor_key=F(self.key))
+
+        position = self.decode_cursor(cursor)
+        backwards = bool(position and position[2])
+        if position:
+            value, pk, _ = position
+            queryset = queryset.filter(
+                self._before(value, pk) if backwards else self._after(value, pk)
+            )
+
+        rows = list(queryset.order_by(*self._ordering(backwards))[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage([])
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else position is not None
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor_for(rows[-1]) if has_next else None,
+            previous_cursor=(
+                self._cursor_for(rows[0], backwards=True) if has_previous else None
+            ),
+        )
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin replacing page number pagination with cursor pagination.
+
+    Views describe their ordering with `get_cursor_ordering` instead of
+    ordering the queryset. The total shown next to the results is cached for
+    `cursor_count_timeout` seconds, set it to None to skip counting.
+    """
+
+    paginate_by = 10
+    cursor_kwarg = "cursor"
+    cursor_count_timeout = 300
+
+    def get_cursor_ordering(self):
+        """
+        Returns:
+            tuple: (key, descending) where key is a field, lookup or annotation.
+        """
+        return "pk", True
+
+    def get_total_count(self, queryset):
+        if self.cursor_count_timeout is None:
+            return None
+
+        try:
+            sql = str(queryset.query)
+        except Exception:
+            return None
+
+        cache_key = "cursor-count:" + hashlib.md5(sql.encode()).hexdigest()
+        return cache.get_or_set(
+            cache_key, queryset.order_by().count, self.cursor_count_timeout
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        key, descending = self.get_cursor_ordering()
+        paginator = CursorPaginator(queryset, page_size, key, descending)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        page.total_count = self.get_total_count(queryset)
+        return paginator, page, page.object_list, page.has_other_pages()
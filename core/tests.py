@@ -1,3 +1,125 @@
-from django.test import TestCase
+from django.core import signing
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from .models import FAQ
+from .pagination import CursorPaginator
+
+
+class CursorTests(SimpleTestCase):
+    def test_encode_decode(self):
+        cursor = CursorPaginator.encode_cursor("b", 7)
+        self.assertEqual(CursorPaginator.decode_cursor(cursor), ("b", 7, False))
+
+        cursor = CursorPaginator.encode_cursor(None, 3, backwards=True)
+        self.assertEqual(CursorPaginator.decode_cursor(cursor), (None, 3, True))
+
+    def test_missing_or_tampered_cursor(self):
+        cursor = CursorPaginator.encode_cursor(10, 10)
+        value, signature = cursor.rsplit(":", 1)
+        self.assertIsNone(CursorPaginator.decode_cursor(None))
+        self.assertIsNone(CursorPaginator.decode_cursor(""))
+        self.assertIsNone(CursorPaginator.decode_cursor(value + ":" + "x" * 27))
+        self.assertIsNone(CursorPaginator.decode_cursor("garbage"))
+        # validly signed with another salt
+        self.assertIsNone(CursorPaginator.decode_cursor(signing.dumps([1, 1, False])))
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # ties on the title and NULL descriptions
+        for title, description in [
+            ("b", "x"),
+            ("a", None),
+            ("c", "y"),
+            ("a", "x"),
+            ("b", None),
+            ("a", "z"),
+            ("c", None),
+        ]:
+            FAQ.objects.create(title=title, description=description, is_active=True)
+
+    def walk(self, paginator):
+        """Pages forward to the end, then back to the start."""
+        forward = [paginator.get_page()]
+        while forward[-1].has_next():
+            forward.append(paginator.get_page(forward[-1].next_cursor))
+
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            backward.append(paginator.get_page(backward[-1].previous_cursor))
+        return [[faq.pk for faq in page] for page in forward], [
+            [faq.pk for faq in page] for page in reversed(backward)
+        ]
+
+    def assertPages(self, paginator, expected):
+        forward, backward = self.walk(paginator)
+        pages = [expected[i : i + 3] for i in range(0, len(expected), 3)]
+        self.assertEqual(forward, pages)
+        self.assertEqual(backward, pages)
+
+    def test_primary_key(self):
+        pks = list(FAQ.objects.order_by("pk").values_list("pk", flat=True))
+        self.assertPages(CursorPaginator(FAQ.objects.all(), 3), pks)
+        self.assertPages(
+            CursorPaginator(FAQ.objects.all(), 3, descending=True), pks[::-1]
+        )
+
+    def test_ties_on_the_sort_key(self):
+        ascending = list(
+            FAQ.objects.order_by("title", "pk").values_list("pk", flat=True)
+        )
+        self.assertPages(CursorPaginator(FAQ.objects.all(), 3, "title"), ascending)
+
+        descending = list(
+            FAQ.objects.order_by("-title", "-pk").values_list("pk", flat=True)
+        )
+        self.assertPages(
+            CursorPaginator(FAQ.objects.all(), 3, "title", descending=True),
+            descending,
+        )
+
+    def test_null_keys_are_last(self):
+        for descending in (False, True):
+            key = "-description" if descending else "description"
+            expected = list(
+                FAQ.objects.exclude(description=None)
+                .order_by(key, "-pk" if descending else "pk")
+                .values_list("pk", flat=True)
+            ) + list(
+                FAQ.objects.filter(description=None)
+                .order_by("-pk" if descending else "pk")
+                .values_list("pk", flat=True)
+            )
+            self.assertPages(
+                CursorPaginator(FAQ.objects.all(), 3, "description", descending),
+                expected,
+            )
+
+    def test_page_boundaries(self):
+        paginator = CursorPaginator(FAQ.objects.all(), 3, "title")
+        first = paginator.get_page()
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        second = paginator.get_page(first.next_cursor)
+        self.assertTrue(second.has_previous())
+        self.assertEqual(list(paginator.get_page(second.previous_cursor)), list(first))
+
+        last = paginator.get_page(second.next_cursor)
+        self.assertEqual(len(last), 1)
+        self.assertTrue(last.has_previous())
+        self.assertFalse(last.has_next())
+
+        # a last page which is exactly full has no next page either
+        only = CursorPaginator(FAQ.objects.all(), 7, "title").get_page()
+        self.assertEqual(len(only), 7)
+        self.assertFalse(only.has_other_pages())
+
+    def test_tampered_cursor_starts_over(self):
+        paginator = CursorPaginator(FAQ.objects.all(), 3, "title")
+        first = paginator.get_page()
+        tampered = first.next_cursor[:-1] + (
+            "A" if first.next_cursor[-1] != "A" else "B"
+        )
+        self.assertEqual(list(paginator.get_page(tampered)), list(first))
@@ -4,6 +4,7 @@ from .views import (
     ContactUsDeleteView,
     ContactUsListView,
     DashboardView,
+    ExportView,
     FAQCreateView,
     FAQDeleteView,
     FAQListView,
@@ -21,6 +22,7 @@ app_name = "core"
 urlpatterns = [
     path(r"admin/", DashboardView.as_view(), name="dashboard"),
     path(r"admin/settings/", SiteSettingView.as_view(), name="site_settings"),
+    path(r"admin/export/<str:name>/", ExportView.as_view(), name="export"),
     # contact_us
     path(r"admin/contact_us/", ContactUsListView.as_view(), name="admin_contact_us"),
     path(
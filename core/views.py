@@ -1,10 +1,9 @@
 from dateutil.relativedelta import relativedelta
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, Value
-from django.db.models.functions import Coalesce, TruncMonth
-from django.db.models.functions import Lower as LowerCase
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.views import View
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -15,9 +14,13 @@ from django.views.generic import (
     UpdateView,
 )
 
-from accounts.models import User
-from property.models import Property, PropertyType
+from analytic.models import PopularSearch, PropertyDailyStats, SiteDailyStats
+from analytic.views import UserActivity
+from property.facets import get_facet_context
+from property.fragments import card_cache_metrics
+from property.models import Property
 
+from .export import EXPORT_FORMATS, EXPORTS, Export
 from .forms import (
     AboutUsForm,
     ContactInfoForm,
@@ -35,10 +38,13 @@ from .models import (
     AboutUs,
     ContactInfo,
     ContactUs,
+    DashboardStats,
+    MonthlyUserJoins,
     PrivacyPolicy,
     SiteSettings,
     TermsAndCondition,
 )
+from .page_cache import AnonymousPageCacheMixin
 from .utils import get_date_range
 
 
@@ -72,28 +78,41 @@ class DashboardView(AdminLoginRequired, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["user_count"] = User.objects.count()
-        context["property_count"] = Property.objects.count()
-        context["type_count"] = PropertyType.objects.count()
-
-        context["latest_properties"] = Property.objects.order_by("-created_at")[:5]
-        context["viewed_properties"] = Property.objects.annotate(
-            view_count=Count("browsing_stats")
-        ).order_by("-view_count")[:5]
-        context["popular_properties"] = Property.objects.order_by("-rating")[:5]
+        stats = DashboardStats.load()
+        context["user_count"] = stats.user_count
+        context["property_count"] = stats.property_count
+        context["type_count"] = stats.type_count
+
+        context["latest_properties"] = Property.objects.for_cards().order_by(
+            "-created_at"
+        )[:5]
+        top_viewed = [
+            pk for pk, _ in PropertyDailyStats.get_top_viewed(days=30, limit=5)
+        ]
+        viewed_properties = Property.objects.for_cards().in_bulk(top_viewed)
+        context["viewed_properties"] = [
+            viewed_properties[pk] for pk in top_viewed if pk in viewed_properties
+        ]
+        context["popular_properties"] = Property.objects.for_cards().order_by(
+            "-rating"
+        )[:5]
+        context["unique_visitors"] = {
+            "week": SiteDailyStats.get_unique_viewers(days=7),
+            "month": SiteDailyStats.get_unique_viewers(days=30),
+        }
+        context["popular_searches"] = {
+            dimension.label: PopularSearch.get_top(dimension, days=7, limit=5)
+            for dimension in PopularSearch.Dimension
+        }
+        context["card_cache"] = card_cache_metrics.get_metrics()
 
         start_date, end_date = get_date_range()
-        qs = (
-            User.objects.filter(
-                date_joined__date__gte=start_date, date_joined__date__lte=end_date
-            )
-            .annotate(month=TruncMonth("date_joined"))
-            .values("month")
-            .annotate(count=Count("id"))
-            .order_by("month")
-        )
-
-        month_data = {entry["month"].strftime("%B"): entry["count"] for entry in qs}
+        month_data = {
+            month.strftime("%B"): count
+            for month, count in MonthlyUserJoins.get_series(
+                start_date, end_date
+            ).items()
+        }
         month_list, user_counts = [], []
         current = start_date
         while current <= end_date:
@@ -106,6 +125,25 @@ class DashboardView(AdminLoginRequired, TemplateView):
         return context
 
 
+class ExportView(AdminLoginRequired, View):
+    """
+    Stream a table as CSV or JSON lines, optionally gzip compressed.
+    """
+
+    def get(self, request, name):
+        if name not in EXPORTS:
+            raise Http404
+        export_format = request.GET.get("format")
+        export = Export.for_table(
+            name,
+            format=export_format if export_format in EXPORT_FORMATS else "csv",
+            compress=request.GET.get("gzip") == "1",
+        )
+        response = StreamingHttpResponse(export, content_type=export.content_type)
+        response["Content-Disposition"] = f'attachment; filename="{export.filename}"'
+        return response
+
+
 class SiteSettingView(AdminLoginRequired, FormView):
     template_name = "admin/pages/settings.html"
     success_url = "/admin/settings/"
@@ -159,7 +197,8 @@ class SiteSettingView(AdminLoginRequired, FormView):
             return redirect(self.success_url)
 
         model_class = form_info["model"]
-        instance = model_class.load()
+        # edit the stored row, not the cached copy
+        instance, _ = model_class.objects.get_or_create(pk=1)
 
         for field, value in form.cleaned_data.items():
             if field in self.request.FILES:
@@ -229,38 +268,21 @@ class HomeView(TemplateView):
     template_name = "customer/pages/home.html"
 
     def get_context_data(self, **kwargs):
-        cities = ["ahmedabad", "mumbai", "delhi", "bangalore", "kolkata"]
-
         context = super().get_context_data(**kwargs)
-        property_counts = PropertyType.objects.annotate(
-            property_count=Count("properties")
-        ).values("name", "property_count")
-
-        context.update(
-            {
-                property_type["name"]
-                .lower()
-                .replace("/", "_")
-                .replace(" ", "_"): property_type["property_count"]
-                for property_type in property_counts
-            }
-        )
+        context.update(get_facet_context())
         context["about_us"] = AboutUs.load()
-        context["featured_properties"] = Property.objects.all()[:3]
-        context.update({f"{city.lower()}_count": 0 for city in cities})
-        for city, count in (
-            Property.objects.annotate(lower_city=LowerCase("city"))
-            .filter(lower_city__in=cities)
-            .values("city")
-            .annotate(count=Coalesce(Count("id"), Value(0)))
-            .values_list("city", "count")
-        ):
-            context[f"{city.lower()}_count"] = count
-
+        context["featured_properties"] = Property.objects.for_cards().order_by(
+            "-trending_score", "-pk"
+        )[:3]
+        context["liked_property_ids"] = UserActivity(
+            self.request.user
+        ).get_liked_property_ids(
+            [property.pk for property in context["featured_properties"]]
+        )
         return context
 
 
-class AboutUsView(DetailView):
+class AboutUsView(AnonymousPageCacheMixin, DetailView):
     model = AboutUs
     template_name = "customer/pages/about_us.html"
 
@@ -284,7 +306,7 @@ class ContactUsView(CreateView):
         return super().form_valid(form)
 
 
-class TermsAndConditionView(DetailView):
+class TermsAndConditionView(AnonymousPageCacheMixin, DetailView):
     model = TermsAndCondition
     template_name = "customer/pages/terms_and_condition.html"
 
@@ -292,7 +314,7 @@ class TermsAndConditionView(DetailView):
         return TermsAndCondition.load()
 
 
-class PrivacyPolicyView(DetailView):
+class PrivacyPolicyView(AnonymousPageCacheMixin, DetailView):
     model = PrivacyPolicy
     template_name = "customer/pages/privacy_policy.html"
 
@@ -300,5 +322,5 @@ class PrivacyPolicyView(DetailView):
         return PrivacyPolicy.load()
 
 
-class FAQView(TemplateView):
+class FAQView(AnonymousPageCacheMixin, TemplateView):
     template_name = "customer/pages/faq.html"
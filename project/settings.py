@@ -104,6 +104,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The local memory cache is per process, when running several workers use a
+# shared backend so invalidations reach all of them, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -181,6 +198,49 @@ LOGGING = {
 }
 
 
+# write-behind buffer of property views, see analytic.buffer
+VIEW_BUFFER_MAX_SIZE = 10_000
+VIEW_BUFFER_FLUSH_INTERVAL = 5
+VIEW_BUFFER_BATCH_SIZE = 1000
+
+# write-behind buffer of searches, see analytic.buffer
+SEARCH_BUFFER_MAX_SIZE = 10_000
+SEARCH_BUFFER_FLUSH_INTERVAL = 5
+
+# values counted by the home page and listing facets, see property.facets
+PROPERTY_FACETS = {
+    "city": [
+        "Ahmedabad",
+        "Mumbai",
+        "Delhi",
+        "Bangalore",
+        "Kolkata",
+        "Hyderabad",
+        "Vijaywada",
+        "Chennai",
+    ],
+    "state": [],
+}
+
+# seconds between refreshes of the similar properties of changed properties,
+# see analytic.similarity
+SIMILARITY_REFRESH_INTERVAL = 30
+
+# heavy hitter sketches of searched values, see analytic.heavy_hitters
+POPULAR_SEARCH_CAPACITY = 200
+POPULAR_SEARCH_PERSIST_INTERVAL = 60
+
+
+# days of history kept by the prune_analytics command, None keeps every row.
+# Likes are the current liked state of users, they are kept by default.
+ANALYTIC_RETENTION_DAYS = {
+    "browsing": 365,
+    "search": 180,
+    "likes": None,
+    "popular_search": 90,
+}
+
+
 STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
 
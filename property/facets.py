@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Property, PropertySearch, PropertyType
+from .utils import normalize_text
+
+FACET_CACHE_KEY = "property_facets"
+FACET_CACHE_TIMEOUT = 60 * 60
+
+
+def get_facet_counts():
+    """
+    Number of properties per counted city, state, type and post type.
+
+    Every count is a filtered aggregate of a single query over the indexed
+    search rows. The counts are cached until a property or type changes.
+
+    Returns:
+        dict: facet name to a mapping of value to count, types are keyed by
+        their name.
+    """
+    facets = cache.get(FACET_CACHE_KEY)
+    if facets is not None:
+        return facets
+
+    type_ids = defaultdict(list)
+    for pk, name in PropertyType.objects.values_list("pk", "name"):
+        type_ids[name].append(pk)
+
+    filters = {
+        "city": {
+            city: Q(city=city)
+            for city in map(normalize_text, settings.PROPERTY_FACETS["city"])
+        },
+        "state": {
+            state: Q(state=state)
+            for state in map(normalize_text, settings.PROPERTY_FACETS["state"])
+        },
+        "type": {name: Q(type_id__in=pks) for name, pks in type_ids.items()},
+        "post_type": {
+            post_type: Q(post_type=post_type) for post_type in Property.PostType.values
+        },
+    }
+    counts = PropertySearch.objects.aggregate(
+        **{
+            f"{facet}_{index}": Count("pk", filter=value_filter)
+            for facet, value_filters in filters.items()
+            for index, value_filter in enumerate(value_filters.values())
+        }
+    )
+
+    facets = {
+        facet: {
+            value: counts[f"{facet}_{index}"]
+            for index, value in enumerate(value_filters)
+        }
+        for facet, value_filters in filters.items()
+    }
+    cache.set(FACET_CACHE_KEY, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate_facet_counts():
+    cache.delete(FACET_CACHE_KEY)
+
+
+def get_facet_context():
+    """
+    Template context of the facet counts, `{city}_count` per city and the
+    type name with "/" and spaces replaced by "_" per property type.
+    """
+    facets = get_facet_counts()
+    context = {"facets": facets}
+    context.update(
+        {
+            f"{city.replace(' ', '_')}_count": count
+            for city, count in facets["city"].items()
+        }
+    )
+    context.update(
+        {
+            name.lower().replace("/", "_").replace(" ", "_"): count
+            for name, count in facets["type"].items()
+        }
+    )
+    return context
@@ -0,0 +1,68 @@
+import threading
+
+from django.core.cache import cache
+
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# marks the live parts of a card in the cached html, user text is escaped so
+# it can never contain one
+CARD_LIVE_MARKER = "<!--card-live-%d-->"
+
+
+def get_card_cache_key(property, variant):
+    """
+    Cache key of the html of a property card.
+
+    Anything a card renders outside of its live parts is part of the
+    property, its images, details or type, all of which change
+    `updated_at` when saved.
+    """
+    return f"property_card:{variant}:{property.pk}:{property.updated_at.timestamp()}"
+
+
+class CardCacheMetrics:
+    """
+    Hit and miss counts of the property card cache of this process.
+
+    The counts are kept in memory so recording one costs no cache round
+    trip. With several workers each one only reports its own renders since
+    it started, the dashboard labels them as such.
+    """
+
+    def __init__(self):
+        self.metrics = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            self.metrics["hits" if hit else "misses"] += 1
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        total = metrics["hits"] + metrics["misses"]
+        metrics["hit_ratio"] = metrics["hits"] / total if total else None
+        return metrics
+
+
+card_cache_metrics = CardCacheMetrics()
+
+
+def get_cached_cards(properties, variant):
+    """
+    Read the cached cards of several properties with a single cache read.
+
+    Returns:
+        dict: cache key to the card html, None for the cards not cached.
+    """
+    keys = [get_card_cache_key(property, variant) for property in properties]
+    cards = cache.get_many(keys)
+    return {key: cards.get(key) for key in keys}
+
+
+def get_cached_card(key):
+    return cache.get(key)
+
+
+def set_cached_card(key, html):
+    cache.set(key, html, CARD_CACHE_TIMEOUT)
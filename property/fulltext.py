@@ -0,0 +1,224 @@
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger("app")
+
+FTS_TABLE = "property_property_fts"
+PROPERTY_TABLE = "property_property"
+
+# bm25 column weights, in the order of the indexed columns
+FTS_WEIGHTS = {
+    "name": 10.0,
+    "description": 1.0,
+    "address": 2.0,
+    "seo_keywords": 5.0,
+}
+
+
+def get_terms(query):
+    """
+    Split a free text query into the words used to build a full-text query.
+    """
+    return re.findall(r"\w+", query.lower()) if query else []
+
+
+class BaseFullTextBackend:
+    """
+    Fallback used when the database has no full-text support, behaves like
+    the previous `icontains` search and ranks every match equally.
+    """
+
+    def setup(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index(self, property):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def filter_q(self, query):
+        terms = get_terms(query)
+        filters = Q()
+        for term in terms:
+            filters &= (
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(address__icontains=term)
+                | Q(seo_keywords__icontains=term)
+            )
+        return filters if terms else Q(pk__in=[])
+
+    def rank(self, queryset, query):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def search(self, queryset, query):
+        """
+        Filter a Property queryset by the query and annotate `search_rank`,
+        lower is a better match.
+        """
+        return self.rank(queryset.filter(self.filter_q(query)), query)
+
+
+class SQLiteFullTextBackend(BaseFullTextBackend):
+    """
+    FTS5 virtual table keyed by property id, ranked with bm25.
+    """
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            exists = cursor.fetchone() is not None
+            if not exists:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"{', '.join(FTS_WEIGHTS)}, "
+                    "tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        if not exists:
+            self.rebuild()
+
+    def rebuild(self):
+        columns = ", ".join(FTS_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+                f"SELECT id, {columns} FROM {PROPERTY_TABLE}"
+            )
+
+    def index(self, property):
+        columns = ", ".join(FTS_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [property.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(FTS_WEIGHTS))})",
+                [property.pk, *(getattr(property, field) for field in FTS_WEIGHTS)],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+    def to_match(self, query):
+        # quote every term so user input cannot inject FTS5 syntax, prefix
+        # matching keeps partially typed words matching while searching
+        return " ".join(f'"{term}"*' for term in get_terms(query))
+
+    def filter_q(self, query):
+        match = self.to_match(query)
+        if not match:
+            return Q(pk__in=[])
+        return Q(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        )
+
+    def rank(self, queryset, query):
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS.values())
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {PROPERTY_TABLE}.id",
+                [self.to_match(query)],
+                output_field=FloatField(),
+            )
+        )
+
+
+class PostgresFullTextBackend(BaseFullTextBackend):
+    """
+    Weighted tsvector expression over the property columns backed by a GIN
+    index, kept current by the database itself.
+    """
+
+    index_name = "property_property_fts_idx"
+    document = (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(seo_keywords, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(address, '')), 'C') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+    )
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index_name} "
+                f"ON {PROPERTY_TABLE} USING GIN (({self.document}))"
+            )
+
+    def to_tsquery(self, query):
+        return " & ".join(f"{term}:*" for term in get_terms(query))
+
+    def filter_q(self, query):
+        tsquery = self.to_tsquery(query)
+        if not tsquery:
+            return Q(pk__in=[])
+        return Q(
+            pk__in=RawSQL(
+                f"SELECT id FROM {PROPERTY_TABLE} "
+                f"WHERE ({self.document}) @@ to_tsquery('english', %s)",
+                [tsquery],
+            )
+        )
+
+    def rank(self, queryset, query):
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"-ts_rank_cd(({self.document}), to_tsquery('english', %s))",
+                [self.to_tsquery(query)],
+                output_field=FloatField(),
+            )
+        )
+
+
+_backend = None
+
+
+def get_fulltext_backend():
+    """
+    Return the full-text backend matching the default database.
+    """
+    global _backend
+    if _backend is None:
+        backend_class = {
+            "sqlite": SQLiteFullTextBackend,
+            "postgresql": PostgresFullTextBackend,
+        }.get(connection.vendor, BaseFullTextBackend)
+        _backend = backend_class()
+    return _backend
+
+
+def setup_fulltext(sender, using="default", **kwargs):
+    """
+    post_migrate hook creating the full-text index, falls back to the plain
+    `icontains` search if the database cannot build it.
+    """
+    global _backend
+    if using != "default":
+        return
+
+    try:
+        get_fulltext_backend().setup()
+    except DatabaseError:
+        logger.exception("Full-text index unavailable, using icontains search")
+        _backend = BaseFullTextBackend()
+
+
+def search_properties(queryset, query):
+    """
+    Filter a Property queryset by a free text query and annotate `search_rank`.
+    """
+    return get_fulltext_backend().search(queryset, query)
@@ -0,0 +1,153 @@
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+# size of a grid cell in degrees, ~11km of latitude
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = int(360 / GRID_CELL_DEGREES)
+
+# radius queries covering more cells than this only use the bounding box
+MAX_GRID_CELLS = 400
+
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 500
+
+
+def get_grid_cell(lat, lng):
+    """
+    Return the id of the grid cell containing a coordinate.
+    """
+    row = math.floor((lat + 90) / GRID_CELL_DEGREES)
+    column = math.floor((lng + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def get_bounding_box(lat, lng, radius_km):
+    """
+    Calculate the latitude/longitude box enclosing a circle.
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lng, max_lng)
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(lat - delta_lat, -90.0), min(lat + delta_lat, 90.0)
+
+    cos_lat = math.cos(math.radians(lat))
+    if max_lat >= 90 or min_lat <= -90 or cos_lat <= 0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    delta_lng = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    return min_lat, max_lat, max(lng - delta_lng, -180.0), min(lng + delta_lng, 180.0)
+
+
+def get_grid_cells(bounding_box):
+    """
+    List the grid cells covering a bounding box, or None if there are too many
+    for an `IN` lookup to pay off.
+
+    Columns wrap at the antimeridian, a box reaching longitude -180 or 180,
+    which includes every box around a pole, returns None as well.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box
+    if min_lng <= -180 or max_lng >= 180:
+        return None
+
+    first_row, first_column = divmod(get_grid_cell(min_lat, min_lng), GRID_COLUMNS)
+    last_row, last_column = divmod(get_grid_cell(max_lat, max_lng), GRID_COLUMNS)
+
+    rows = last_row - first_row + 1
+    columns = last_column - first_column + 1
+    if rows * columns > MAX_GRID_CELLS:
+        return None
+
+    return [
+        row * GRID_COLUMNS + column
+        for row in range(first_row, last_row + 1)
+        for column in range(first_column, last_column + 1)
+    ]
+
+
+def parse_near(value):
+    """
+    Parse a "lat,lng" string.
+
+    Returns:
+        tuple: (lat, lng) as floats, or None if the value is not a valid coordinate.
+    """
+    try:
+        lat, lng = (float(part) for part in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def parse_radius(value):
+    """
+    Parse a radius in km, clamped to MAX_RADIUS_KM.
+    """
+    try:
+        radius = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RADIUS_KM
+
+    if not math.isfinite(radius) or radius <= 0:
+        return DEFAULT_RADIUS_KM
+    return min(radius, MAX_RADIUS_KM)
+
+
+def distance_expression(lat, lng, lat_field, lng_field):
+    """
+    Haversine great-circle distance in km between a point and two model fields.
+    """
+    lat_radians = math.radians(lat)
+    half_delta_lat = (Radians(F(lat_field)) - Value(lat_radians)) / 2
+    half_delta_lng = (Radians(F(lng_field)) - Value(math.radians(lng))) / 2
+    return (
+        2
+        * EARTH_RADIUS_KM
+        * ASin(
+            Sqrt(
+                Power(Sin(half_delta_lat), 2)
+                + Value(math.cos(lat_radians))
+                * Cos(Radians(F(lat_field)))
+                * Power(Sin(half_delta_lng), 2)
+            )
+        )
+    )
+
+
+def filter_within_radius(queryset, lat, lng, radius_km, prefix="search__"):
+    """
+    Restrict a queryset to rows within `radius_km` of a point and annotate
+    `distance` in km.
+
+    The grid cell and bounding box lookups are indexed and prune candidates
+    before the exact haversine distance is computed.
+    """
+    bounding_box = get_bounding_box(lat, lng, radius_km)
+    min_lat, max_lat, min_lng, max_lng = bounding_box
+
+    cells = get_grid_cells(bounding_box)
+    if cells is not None:
+        queryset = queryset.filter(**{f"{prefix}grid_cell__in": cells})
+
+    return (
+        queryset.filter(
+            **{
+                f"{prefix}latitude__range": (min_lat, max_lat),
+                f"{prefix}longitude__range": (min_lng, max_lng),
+            }
+        )
+        .annotate(
+            distance=distance_expression(
+                lat, lng, f"{prefix}latitude", f"{prefix}longitude"
+            )
+        )
+        .filter(distance__lte=Value(radius_km, output_field=FloatField()))
+    )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from analytic.similarity import get_similarity_refresher
+from property.fulltext import get_fulltext_backend
+from property.models import DETAIL_MODELS, Property
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the detail kinds, denormalized search rows and full-text index "
+        "of every property"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of properties loaded per query",
+        )
+
+    def handle(self, *args, **options):
+        for detail_model in DETAIL_MODELS:
+            Property.objects.filter(
+                pk__in=detail_model.objects.values("property_id")
+            ).exclude(detail_kind=detail_model.detail_kind).update(
+                detail_kind=detail_model.detail_kind
+            )
+
+        count = 0
+        last_pk = 0
+        # refreshing the similar properties of every row one by one is
+        # quadratic, they are recomputed at once by compute_property_similarity
+        with get_similarity_refresher().suspended():
+            while True:
+                properties = list(
+                    Property.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .with_details()[: options["chunk_size"]]
+                )
+                if not properties:
+                    break
+
+                for property in properties:
+                    property.update_search()
+                count += len(properties)
+                last_pk = properties[-1].pk
+
+        get_fulltext_backend().rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt search rows for {count} properties")
+        )
+        self.stdout.write(
+            "Run compute_property_similarity to refresh the similar properties"
+        )
@@ -1,9 +1,20 @@
-from django.db import models
-from django.db.models import Sum
+from collections import defaultdict
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.query import ModelIterable
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from slugify import slugify
 
 from accounts.models import User
 
+from .fulltext import get_fulltext_backend
+from .geo import get_grid_cell
+from .utils import normalize_text, parse_area
+
 
 class TransactionType(models.TextChoices):
     NEW_PROPERTY = "New Property"
@@ -45,6 +56,100 @@ class PropertyType(models.Model):
         verbose_name_plural = "Property Types"
 
 
+class DetailKind(models.TextChoices):
+    AGRICULTURE = "agriculture"
+    FLAT = "flat"
+    VILLA = "villa"
+    PLOT = "plot"
+    OFFICE = "office"
+    HOUSE = "house"
+
+
+DETAIL_RELATED_NAMES = {
+    DetailKind.AGRICULTURE: "agriculture_details",
+    DetailKind.FLAT: "flat_details",
+    DetailKind.VILLA: "villa_details",
+    DetailKind.PLOT: "plot_details",
+    DetailKind.OFFICE: "office_details",
+    DetailKind.HOUSE: "house_details",
+}
+
+# counters and scores kept up to date by the analytic and review apps
+COUNTER_FIELDS = (
+    "like_count",
+    "view_count",
+    "approved_review_count",
+    "rating",
+    "trending_score",
+)
+
+
+def attach_details(properties):
+    """
+    Load the details of many properties with one query per detail kind and
+    cache them on the instances, so `details` does not query again
+    """
+    pending = defaultdict(dict)
+    for property in properties:
+        if not property.detail_kind:
+            continue
+        relation = Property._meta.get_field(DETAIL_RELATED_NAMES[property.detail_kind])
+        if not relation.is_cached(property):
+            pending[property.detail_kind][property.pk] = property
+
+    for detail_kind, group in pending.items():
+        relation = Property._meta.get_field(DETAIL_RELATED_NAMES[detail_kind])
+        details_by_property = {
+            details.property_id: details
+            for details in relation.related_model.objects.filter(
+                property__in=list(group)
+            )
+        }
+        for pk, property in group.items():
+            details = details_by_property.get(pk)
+            relation.set_cached_value(property, details)
+            if details is not None:
+                relation.field.set_cached_value(details, property)
+
+
+class PropertyQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._with_details = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_details = self._with_details
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if (
+            fetched
+            and self._with_details
+            and issubclass(self._iterable_class, ModelIterable)
+        ):
+            attach_details(self._result_cache)
+
+    def with_details(self):
+        """
+        Attach the details of the fetched properties grouped by detail kind
+        """
+        clone = self._chain()
+        clone._with_details = True
+        return clone
+
+    def for_cards(self):
+        """
+        Load everything a property card renders (type, owner, images and
+        details) in a fixed number of queries regardless of the number of cards
+        """
+        return self.select_related(
+            "type", "user", "search", *DETAIL_RELATED_NAMES.values()
+        ).prefetch_related("images")
+
+
 class Property(models.Model):
     class PostType(models.TextChoices):
         SALE = "Sale"
@@ -78,47 +183,78 @@ class Property(models.Model):
     rera_number = models.CharField(max_length=255, null=True, blank=True)
 
     #
-    rating = models.FloatField(null=True, editable=False)
+    rating = models.FloatField(null=True, db_index=True, editable=False)
+    # denormalized counters, only ever changed with F() updates
+    like_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    view_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    approved_review_count = models.PositiveIntegerField(default=0, editable=False)
+    # log of the forward decayed engagement, see analytic.trending
+    trending_score = models.FloatField(default=0, db_index=True, editable=False)
+    detail_kind = models.CharField(
+        choices=DetailKind.choices,
+        max_length=20,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     is_active = models.BooleanField(default=True)
     is_verified = models.BooleanField(default=False)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PropertyQuerySet.as_manager()
+
     @property
     def details(self):
-        for attr in [
-            "agriculture_details",
-            "flat_details",
-            "villa_details",
-            "plot_details",
-            "office_details",
-            "house_details",
-        ]:
-            if hasattr(self, attr):
-                return getattr(self, attr)
-        return None
+        if not self.detail_kind:
+            return None
+        try:
+            return getattr(self, DETAIL_RELATED_NAMES[self.detail_kind])
+        except ObjectDoesNotExist:
+            return None
 
     @property
     def views(self):
-        return self.browsing_stats.count()
+        return self.view_count
 
     def update_rating(self):
         """
-        Recalculate rating field
+        Recalculate rating field and the approved review counter
         """
-        approved_reviews = self.reviews.filter(status="Approved")
-        reviews_count = approved_reviews.count()
+        approved_reviews = self.reviews.filter(status="Approved").aggregate(
+            count=Count("pk"), sum=Sum("score")
+        )
+        reviews_count = approved_reviews["count"]
         if reviews_count > 0:
-            reviews_sum = approved_reviews.aggregate(sum=Sum("score"))["sum"]
-            self.rating = float(reviews_sum) / reviews_count
+            self.rating = float(approved_reviews["sum"]) / reviews_count
         else:
             self.rating = None
-        self.save()
+        self.approved_review_count = reviews_count
+        Property.objects.filter(pk=self.pk).update(
+            rating=self.rating, approved_review_count=reviews_count
+        )
+
+    def update_search(self, details=None):
+        """
+        Refresh the denormalized search row of this property
+        """
+        details = details if details is not None else self.details
+        PropertySearch.objects.update_or_create(
+            property=self, defaults=PropertySearch.values_for(self, details)
+        )
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # never write back counters that may have changed since this
+            # instance was loaded
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
         return super().save(*args, **kwargs)
 
     def __str__(self):
@@ -168,6 +304,8 @@ class Flat(BaseProperty):
         DUPLEX_FLAT = "Duplex Flat"
         TRIPLEX_FLAT = "Triplex Flat"
 
+    detail_kind = DetailKind.FLAT
+
     property = models.OneToOneField(
         Property, related_name="flat_details", on_delete=models.CASCADE
     )
@@ -197,6 +335,8 @@ class Villa(BaseProperty):
         DUPLEX_FLAT = "Duplex Flat"
         TRIPLEX_FLAT = "Triplex Flat"
 
+    detail_kind = DetailKind.VILLA
+
     property = models.OneToOneField(
         Property, related_name="villa_details", on_delete=models.CASCADE
     )
@@ -227,6 +367,8 @@ class Plot(BaseProperty):
         COMMERCIAL_PLOT_IN_COLONY = "Commercial Plot In Colony/Society"
         COMMERCIAL_PLOT_IN_GATED_COMMUNITY = "Commercial Plot In Gated Community"
 
+    detail_kind = DetailKind.PLOT
+
     property = models.OneToOneField(
         Property, related_name="plot_details", on_delete=models.CASCADE
     )
@@ -248,6 +390,8 @@ class Office(BaseProperty):
         OFFICE_SPACE = "Office Space"
         PLUG_AND_PLAY_OFFICE_SPACE = "Plug and Play Office Space"
 
+    detail_kind = DetailKind.OFFICE
+
     property = models.OneToOneField(
         Property, related_name="office_details", on_delete=models.CASCADE
     )
@@ -281,6 +425,8 @@ class House(BaseProperty):
         GROUND_PLUS_SIX_FLOORS = "Ground + 6 Floors"
         GROUND_PLUS_SIX_PLUS_FLOORS = "Ground + 6 Floors +"
 
+    detail_kind = DetailKind.HOUSE
+
     property = models.OneToOneField(
         Property, related_name="house_details", on_delete=models.CASCADE
     )
@@ -304,6 +450,8 @@ class House(BaseProperty):
 
 
 class AgricultureLand(BaseProperty):
+    detail_kind = DetailKind.AGRICULTURE
+
     property = models.OneToOneField(
         Property, related_name="agriculture_details", on_delete=models.CASCADE
     )
@@ -312,3 +460,200 @@ class AgricultureLand(BaseProperty):
 
     def __str__(self):
         return f"{self.property.name} - Agriculture"
+
+
+DETAIL_MODELS = (AgricultureLand, Flat, Villa, Plot, Office, House)
+
+
+class PropertySearch(models.Model):
+    """
+    Denormalized, indexed projection of a property and its details used by
+    the customer listing to filter and sort without joining every detail table.
+    """
+
+    property = models.OneToOneField(
+        Property, related_name="search", on_delete=models.CASCADE, primary_key=True
+    )
+    post_type = models.CharField(choices=Property.PostType.choices, max_length=20)
+    type = models.ForeignKey(
+        PropertyType, related_name="+", on_delete=models.SET_NULL, null=True
+    )
+    # normalized with normalize_text
+    state = models.CharField(max_length=255)
+    city = models.CharField(max_length=100)
+    postal_code = models.CharField(max_length=6, blank=True)
+
+    price = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    area = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    bedrooms = models.PositiveSmallIntegerField(null=True)
+    bathrooms = models.PositiveSmallIntegerField(null=True)
+    furnish = models.CharField(choices=FurnishingType.choices, max_length=50, null=True)
+    possession = models.CharField(
+        choices=PossessionType.choices, max_length=100, null=True
+    )
+
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    grid_cell = models.PositiveIntegerField(null=True)
+
+    @staticmethod
+    def values_for(property, details):
+        """
+        Build the search row values from a property and its (optional) details
+        """
+        has_location = property.lat is not None and property.long is not None
+        latitude = float(property.lat) if has_location else None
+        longitude = float(property.long) if has_location else None
+        return {
+            "post_type": property.post_type,
+            "type_id": property.type_id,
+            "state": normalize_text(property.state),
+            "city": normalize_text(property.city),
+            "postal_code": property.postal_code,
+            "latitude": latitude,
+            "longitude": longitude,
+            "grid_cell": get_grid_cell(latitude, longitude) if has_location else None,
+            **PropertySearch.detail_values(details),
+        }
+
+    @staticmethod
+    def detail_values(details):
+        """
+        Extract the searchable columns of a detail instance, all None if missing
+        """
+        if details is None:
+            return dict.fromkeys(
+                ("price", "area", "bedrooms", "bathrooms", "furnish", "possession")
+            )
+
+        if isinstance(details, AgricultureLand):
+            area = parse_area(f"{details.acres} acres")
+        else:
+            area = parse_area(details.area)
+
+        return {
+            "price": details.price,
+            "area": area,
+            "bedrooms": getattr(details, "bedrooms", None),
+            "bathrooms": getattr(details, "bathrooms", None),
+            "furnish": getattr(details, "furnish", None),
+            "possession": getattr(details, "possession", None),
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored values, to tell which fields a save changes
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def has_changed(self, fields):
+        """
+        Whether any of the given fields differs from the loaded row, new rows
+        have changed every field
+        """
+        loaded_values = getattr(self, "_loaded_values", None)
+        if loaded_values is None:
+            return True
+        return any(
+            field not in loaded_values or loaded_values[field] != getattr(self, field)
+            for field in fields
+        )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+    def __str__(self):
+        return f"{self.property_id} - Search"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["price"]),
+            models.Index(fields=["area"]),
+            models.Index(fields=["post_type", "price"]),
+            models.Index(fields=["type", "price"]),
+            models.Index(fields=["city", "price"]),
+            models.Index(fields=["state", "price"]),
+            models.Index(fields=["grid_cell", "latitude", "longitude"]),
+            models.Index(fields=["latitude", "longitude"]),
+        ]
+        verbose_name_plural = "Property Search"
+
+
+@receiver(post_save, sender=Property)
+def _property_post_save_receiver(sender, instance: Property, *args, **kwargs):
+    instance.update_search()
+    get_fulltext_backend().index(instance)
+
+
+@receiver(post_delete, sender=Property)
+def _property_post_delete_receiver(sender, instance: Property, *args, **kwargs):
+    get_fulltext_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=PropertyType)
+@receiver(post_delete, sender=PropertyType)
+def _facets_receiver(sender, *args, **kwargs):
+    from .facets import invalidate_facet_counts
+
+    transaction.on_commit(invalidate_facet_counts)
+
+
+def touch_properties(queryset):
+    """
+    Change `updated_at` without saving, the cached property cards are
+    keyed by it
+    """
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def _card_receiver(sender, instance, *args, **kwargs):
+    touch_properties(Property.objects.filter(pk=instance.property_id))
+
+
+@receiver(post_save, sender=PropertyType)
+@receiver(pre_delete, sender=PropertyType)
+def _type_card_receiver(sender, instance, *args, **kwargs):
+    touch_properties(Property.objects.filter(type=instance))
+
+
+def _set_detail_kind(details, detail_kind, previous_kind=None):
+    """
+    Store the detail kind of a property without re-saving the property
+    """
+    queryset = Property.objects.filter(pk=details.property_id)
+    if previous_kind is not None:
+        queryset = queryset.filter(detail_kind=previous_kind)
+    queryset.update(detail_kind=detail_kind)
+
+    if details._meta.get_field("property").is_cached(details):
+        property = details.property
+        if previous_kind is None or property.detail_kind == previous_kind:
+            property.detail_kind = detail_kind
+
+
+def _detail_post_save_receiver(sender, instance, *args, **kwargs):
+    _set_detail_kind(instance, instance.detail_kind)
+    instance.property.update_search(details=instance)
+
+
+def _detail_post_delete_receiver(sender, instance, *args, **kwargs):
+    _set_detail_kind(instance, "", previous_kind=instance.detail_kind)
+    PropertySearch.objects.filter(property_id=instance.property_id).update(
+        **PropertySearch.detail_values(None)
+    )
+
+
+for detail_model in DETAIL_MODELS:
+    post_save.connect(_detail_post_save_receiver, sender=detail_model)
+    post_delete.connect(_detail_post_delete_receiver, sender=detail_model)
+    post_save.connect(_card_receiver, sender=detail_model)
+    post_delete.connect(_card_receiver, sender=detail_model)
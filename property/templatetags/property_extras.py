@@ -1,6 +1,15 @@
 from django import template
+from django.utils.safestring import mark_safe
 
 from analytic.models import LikeHistory
+from property.fragments import (
+    CARD_LIVE_MARKER,
+    card_cache_metrics,
+    get_cached_card,
+    get_cached_cards,
+    get_card_cache_key,
+    set_cached_card,
+)
 
 register = template.Library()
 
@@ -10,11 +19,105 @@ def to_range(value):
     return range(value)
 
 
-@register.simple_tag
-def has_liked_by(user, property):
+@register.simple_tag(takes_context=True)
+def has_liked_by(context, user, property):
+    # views resolve the liked properties of a page up front
+    liked_property_ids = context.get("liked_property_ids")
+    if liked_property_ids is not None:
+        return property.pk in liked_property_ids
     return LikeHistory.objects.filter(user=user, property=property).exists()
 
 
-@register.simple_tag
-def has_review_by(user, property):
+@register.simple_tag(takes_context=True)
+def has_review_by(context, user, property):
+    reviewed_property_ids = context.get("reviewed_property_ids")
+    if reviewed_property_ids is not None:
+        return property.pk in reviewed_property_ids
     return property.reviews.filter(user=user).exists()
+
+
+class PropertyCardNode(template.Node):
+    def __init__(self, property, variant, nodelist):
+        self.property = property
+        self.variant = variant
+        self.nodelist = nodelist
+        self.live_nodes = nodelist.get_nodes_by_type(CardLiveNode)
+        for index, node in enumerate(self.live_nodes):
+            node.index = index
+
+    def render(self, context):
+        property = self.property.resolve(context)
+        key = get_card_cache_key(property, self.variant.resolve(context))
+        cards = context.render_context.get("property_cards", {})
+        html = cards[key] if key in cards else get_cached_card(key)
+        card_cache_metrics.record(html is not None)
+        if html is None:
+            with context.push(property_card_caching=True):
+                html = self.nodelist.render(context)
+            set_cached_card(key, html)
+            if key in cards:
+                cards[key] = html
+
+        for node in self.live_nodes:
+            marker = CARD_LIVE_MARKER % node.index
+            if marker in html:
+                html = html.replace(marker, node.nodelist.render(context))
+        return mark_safe(html)
+
+
+class CardLiveNode(template.Node):
+    index = None
+
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        if context.get("property_card_caching") and self.index is not None:
+            return CARD_LIVE_MARKER % self.index
+        return self.nodelist.render(context)
+
+
+@register.tag
+def property_card(parser, token):
+    """
+    Cache the html of a property card, keyed by the property, its
+    `updated_at` and the card variant.
+
+    The parts of the card which depend on the viewer or on counters are
+    wrapped in `card_live` and rendered on every request::
+
+        {% property_card property "home" %}
+            ...
+            {% card_live %}
+                {% has_liked_by request.user property as has_liked %}...
+            {% endcard_live %}
+        {% endproperty_card %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' takes a property and a card variant"
+        )
+    nodelist = parser.parse(("endproperty_card",))
+    parser.delete_first_token()
+    return PropertyCardNode(
+        parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), nodelist
+    )
+
+
+@register.tag
+def card_live(parser, token):
+    nodelist = parser.parse(("endcard_live",))
+    parser.delete_first_token()
+    return CardLiveNode(nodelist)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_property_cards(context, properties, variant):
+    """
+    Read the cached cards of a page with one cache read.
+    """
+    cards = context.render_context.get("property_cards", {})
+    cards.update(get_cached_cards(properties, variant))
+    context.render_context["property_cards"] = cards
+    return ""
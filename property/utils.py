@@ -1,3 +1,6 @@
+import re
+from decimal import Decimal, InvalidOperation
+
 import six  # type: ignore
 from django.core.files.uploadedfile import UploadedFile
 from formtools.wizard.storage import BaseStorage, NoFileStorageConfigured
@@ -81,3 +84,62 @@ class CustomSessionStorage(BaseStorage):
                     "charset": field_file.charset,
                 }
                 self.data[self.step_files_key][step][key].append(file_dict)
+
+
+AREA_UNITS = (
+    ("acre", Decimal("43560")),
+    ("yd", Decimal("9")),
+    ("yard", Decimal("9")),
+    ("gaj", Decimal("9")),
+    ("sqm", Decimal("10.7639")),
+    ("sq m", Decimal("10.7639")),
+    ("meter", Decimal("10.7639")),
+    ("metre", Decimal("10.7639")),
+)
+
+
+def parse_area(value):
+    """
+    Parse a free text area such as "1,200 sq ft" or "300 sq yd" into square feet.
+
+    Args:
+        value: The area as entered in the detail forms.
+
+    Returns:
+        The area in square feet as a Decimal, or None if no number is present.
+    """
+    if not value:
+        return None
+
+    match = re.search(r"\d+(?:\.\d+)?", value.replace(",", ""))
+    if not match:
+        return None
+
+    area = Decimal(match.group())
+    unit = value[match.end() :].strip().lower()
+    for name, factor in AREA_UNITS:
+        if name in unit:
+            return (area * factor).quantize(Decimal("0.01"))
+    return area
+
+
+def parse_decimal(value):
+    """
+    Parse a numeric query parameter.
+
+    Returns:
+        A finite, non negative Decimal, or None for blank or invalid values.
+    """
+    try:
+        number = Decimal(value.strip())
+    except (AttributeError, InvalidOperation):
+        return None
+    return number if number.is_finite() and number >= 0 else None
+
+
+def normalize_text(value):
+    """
+    Lower case a text value and collapse its whitespace, so values that only
+    differ in case or spacing compare equal.
+    """
+    return " ".join(str(value or "").lower().split())
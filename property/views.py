@@ -1,16 +1,17 @@
+from itertools import chain
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.files.storage import DefaultStorage
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Count, DecimalField, Q, Value
-from django.db.models.functions import Coalesce
-from django.db.models.functions import Lower as LowerCase
+from django.db.models import Q
 from django.shortcuts import redirect
 from django.views.generic import DetailView, ListView, TemplateView
 from formtools.wizard.views import SessionWizardView
 
 from analytic.views import PropertyRecommender, UserActivity
+from core.pagination import CursorPaginationMixin
 from core.views import (
     AdminLoginRequired,
     BaseAdminCreateView,
@@ -19,6 +20,7 @@ from core.views import (
     BaseAdminUpdateView,
 )
 
+from .facets import get_facet_context
 from .forms import (
     AgricultureLandForm,
     FlatForm,
@@ -29,7 +31,10 @@ from .forms import (
     TypeForm,
     VillaForm,
 )
+from .fulltext import search_properties
+from .geo import filter_within_radius, parse_near, parse_radius
 from .models import Property, PropertyAttributes, PropertyImage, PropertyType
+from .utils import parse_decimal
 
 
 class TypeListView(BaseAdminListView):
@@ -67,8 +72,9 @@ class TypeDeleteView(BaseAdminDeleteView):
     success_url = "/admin/types/"
 
 
-class PropertyListView(BaseAdminListView):
+class PropertyListView(CursorPaginationMixin, BaseAdminListView):
     model = Property
+    paginate_by = 24
     template_name = "admin/pages/property/index.html"
 
     def get_context_data(self, **kwargs):
@@ -273,27 +279,12 @@ class PropertyUpdateView(BasePropertyCreateUpdateView):
     def dispatch(self, request, *args, **kwargs):
         id = kwargs.get("pk")
         property_instance = Property.objects.get(id=id)
-        self.instance_dict = {
-            "0": property_instance,
-            "1": property_instance.agriculture_details
-            if hasattr(property_instance, "agriculture_details")
-            else None,
-            "2": property_instance.villa_details
-            if hasattr(property_instance, "villa_details")
-            else None,
-            "3": property_instance.house_details
-            if hasattr(property_instance, "house_details")
-            else None,
-            "4": property_instance.flat_details
-            if hasattr(property_instance, "flat_details")
-            else None,
-            "5": property_instance.office_details
-            if hasattr(property_instance, "office_details")
-            else None,
-            "6": property_instance.plot_details
-            if hasattr(property_instance, "plot_details")
-            else None,
-        }
+        details = property_instance.details
+        self.instance_dict = {"0": property_instance}
+        for step, form_class in FORMS[1:]:
+            self.instance_dict[step] = (
+                details if isinstance(details, form_class._meta.model) else None
+            )
         return super(PropertyUpdateView, self).dispatch(request, *args, **kwargs)
 
     def done(self, form_list, **kwargs):
@@ -301,18 +292,9 @@ class PropertyUpdateView(BasePropertyCreateUpdateView):
         other_form = form_list[1]
 
         with transaction.atomic():
-            if hasattr(self.instance_dict["0"], "agriculture_details"):
-                self.instance_dict["0"].agriculture_details.delete()
-            elif hasattr(self.instance_dict["0"], "villa_details"):
-                self.instance_dict["0"].villa_details.delete()
-            elif hasattr(self.instance_dict["0"], "house_details"):
-                self.instance_dict["0"].house_details.delete()
-            elif hasattr(self.instance_dict["0"], "flat_details"):
-                self.instance_dict["0"].flat_details.delete()
-            elif hasattr(self.instance_dict["0"], "office_details"):
-                self.instance_dict["0"].office_details.delete()
-            elif hasattr(self.instance_dict["0"], "plot_details"):
-                self.instance_dict["0"].plot_details.delete()
+            details = self.instance_dict["0"].details
+            if details is not None:
+                details.delete()
 
             property_form.instance.user = self.request.user
             property = property_form.save()
@@ -337,19 +319,50 @@ class PropertyDeleteView(BaseAdminDeleteView):
     success_url = "/admin/properties/"
 
 
-class PropertyListingView(LoginRequiredMixin, ListView):
+class PropertyListingView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Property
     paginate_by = 10
     template_name = "customer/pages/listing.html"
 
+    def get_cursor_ordering(self):
+        sort_by = self.request.GET.get("sort")
+        if sort_by == "price":
+            return "search__price", False
+        if sort_by == "-price":
+            return "search__price", True
+        if sort_by == "rating":
+            return "rating", True
+        if sort_by == "popular":
+            return "like_count", True
+        if sort_by == "trending":
+            return "trending_score", True
+        if sort_by == "distance" and parse_near(self.request.GET.get("near")):
+            return "distance", False
+        if self.request.GET.get("q"):
+            return "search_rank", False
+        return "pk", True
+
+    def get(self, request, *args, **kwargs):
+        # later pages of the same search are not a new search
+        if not request.GET.get(self.cursor_kwarg):
+            UserActivity(request.user).record_search(
+                query=request.GET.get("q"),
+                location=request.GET.get("location"),
+                price_min=request.GET.get("min_price"),
+                price_max=request.GET.get("max_price"),
+                type=request.GET.get("type"),
+                post_type=request.GET.get("post_type"),
+                area_min=request.GET.get("min_area"),
+                area_max=request.GET.get("max_area"),
+            )
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().for_cards()
 
         search_query = self.request.GET.get("q")
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | Q(description__icontains=search_query)
-            )
+            queryset = search_properties(queryset, search_query)
 
         location_query = self.request.GET.get("location")
         if location_query:
@@ -358,137 +371,47 @@ class PropertyListingView(LoginRequiredMixin, ListView):
                 | Q(address__icontains=location_query)
                 | Q(state__icontains=location_query)
                 | Q(postal_code__icontains=location_query)
-                | Q(lat__icontains=location_query)
-                | Q(long__icontains=location_query)
+            )
+
+        near = parse_near(self.request.GET.get("near"))
+        if near:
+            queryset = filter_within_radius(
+                queryset, *near, parse_radius(self.request.GET.get("radius"))
             )
 
         type_query = self.request.GET.get("type")
         if type_query:
-            queryset = queryset.filter(Q(type__name__icontains=type_query))
+            queryset = queryset.filter(
+                search__type__in=PropertyType.objects.filter(name__icontains=type_query)
+            )
 
         post_type_query = self.request.GET.get("post_type")
         if post_type_query:
-            queryset = queryset.filter(Q(post_type__icontains=post_type_query))
-
-        min_price = self.request.GET.get("min_price")
-        max_price = self.request.GET.get("max_price")
-        if min_price and max_price:
-            queryset = queryset.annotate(
-                price_to_filter=Coalesce(
-                    "agriculture_details__price",
-                    Coalesce(
-                        "flat_details__price",
-                        "villa_details__price",
-                        "house_details__price",
-                        "office_details__price",
-                        "plot_details__price",
-                        output_field=DecimalField(),
-                    ),
-                )
-            ).filter(price_to_filter__range=(min_price, max_price))
-        if min_price and not max_price:
-            queryset = queryset.annotate(
-                price_to_filter=Coalesce(
-                    "agriculture_details__price",
-                    Coalesce(
-                        "flat_details__price",
-                        "villa_details__price",
-                        "house_details__price",
-                        "office_details__price",
-                        "plot_details__price",
-                        output_field=DecimalField(),
-                    ),
-                )
-            ).filter(price_to_filter__gte=min_price)
-        if max_price and not min_price:
-            queryset = queryset.annotate(
-                price_to_filter=Coalesce(
-                    "agriculture_details__price",
-                    Coalesce(
-                        "flat_details__price",
-                        "villa_details__price",
-                        "house_details__price",
-                        "office_details__price",
-                        "plot_details__price",
-                        output_field=DecimalField(),
-                    ),
-                )
-            ).filter(price_to_filter__lte=max_price)
-
-        # min_area = self.request.GET.get("min_area")
-        # max_area = self.request.GET.get("max_area")
-        # if min_area and max_area:
-        #     queryset = queryset.annotate(
-        #         area_to_filter=Coalesce(
-        #             "agriculture_details__area",
-        #             Coalesce(
-        #                 "flat_details__area",
-        #                 "villa_details__area",
-        #                 "house_details__area",
-        #                 "office_details__area",
-        #                 "plot_details__area",
-        #                 output_field=CharField(),
-        #             ),
-        #         )
-        #     ).filter(area_to_filter__range=(min_area, max_area))
-        # if min_area and not max_area:
-        #     queryset = queryset.annotate(
-        #         area_to_filter=Coalesce(
-        #             "agriculture_details__area",
-        #             Coalesce(
-        #                 "flat_details__area",
-        #                 "villa_details__area",
-        #                 "house_details__area",
-        #                 "office_details__area",
-        #                 "plot_details__area",
-        #                 output_field=CharField(),
-        #             ),
-        #         )
-        #     ).filter(area_to_filter__gte=min_area)
-        # if max_area and not min_area:
-        #     queryset = queryset.annotate(
-        #         area_to_filter=Coalesce(
-        #             "agriculture_details__area",
-        #             Coalesce(
-        #                 "flat_details__area",
-        #                 "villa_details__area",
-        #                 "house_details__area",
-        #                 "office_details__area",
-        #                 "plot_details__area",
-        #                 output_field=CharField(),
-        #             ),
-        #         )
-        #     ).filter(area_to_filter__lte=max_area)
+            post_type = next(
+                (
+                    value
+                    for value in Property.PostType.values
+                    if value.lower() == post_type_query.lower()
+                ),
+                post_type_query,
+            )
+            queryset = queryset.filter(search__post_type=post_type)
 
-        sort_by = self.request.GET.get("sort")
-        if sort_by == "price":
-            queryset = queryset.annotate(
-                price_to_sort=Coalesce(
-                    "agriculture_details__price",
-                    Coalesce(
-                        "flat_details__price",
-                        "villa_details__price",
-                        "house_details__price",
-                        "office_details__price",
-                        "plot_details__price",
-                        output_field=DecimalField(),
-                    ),
-                )
-            ).order_by("price_to_sort")
-        elif sort_by == "-price":
-            queryset = queryset.annotate(
-                price_to_sort=Coalesce(
-                    "agriculture_details__price",
-                    Coalesce(
-                        "flat_details__price",
-                        "villa_details__price",
-                        "house_details__price",
-                        "office_details__price",
-                        "plot_details__price",
-                        output_field=DecimalField(),
-                    ),
-                )
-            ).order_by("-price_to_sort")
+        min_price = parse_decimal(self.request.GET.get("min_price"))
+        if min_price is not None:
+            queryset = queryset.filter(search__price__gte=min_price)
+
+        max_price = parse_decimal(self.request.GET.get("max_price"))
+        if max_price is not None:
+            queryset = queryset.filter(search__price__lte=max_price)
+
+        min_area = parse_decimal(self.request.GET.get("min_area"))
+        if min_area is not None:
+            queryset = queryset.filter(search__area__gte=min_area)
+
+        max_area = parse_decimal(self.request.GET.get("max_area"))
+        if max_area is not None:
+            queryset = queryset.filter(search__area__lte=max_area)
 
         return queryset
 
@@ -496,20 +419,21 @@ class PropertyListingView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context["related_properties"] = Property.objects.all()[:5]
 
-        cities = ["hyderabad", "vijaywada", "bangalore", "chennai"]
-
-        context.update({f"{city.lower()}_count": 0 for city in cities})
-        for city, count in (
-            Property.objects.annotate(lower_city=LowerCase("city"))
-            .filter(lower_city__in=cities)
-            .values("city")
-            .annotate(count=Coalesce(Count("id"), Value(0)))
-            .values_list("city", "count")
-        ):
-            context[f"{city.lower()}_count"] = count
+        context.update(get_facet_context())
 
         recommender = PropertyRecommender(self.request.user)
         context["recommended_properties"] = recommender.get_recommendations(top_n=5)
+
+        context["liked_property_ids"] = UserActivity(
+            self.request.user
+        ).get_liked_property_ids(
+            [
+                property.pk
+                for property in chain(
+                    context["object_list"], context["recommended_properties"]
+                )
+            ]
+        )
         return context
 
 
@@ -517,22 +441,34 @@ class PropertyDetailView(LoginRequiredMixin, DetailView):
     model = Property
     template_name = "customer/pages/property_detail.html"
 
-    def get(self, request, *args, **kwargs):
-        user_activity = UserActivity(request.user)
-        property = self.get_object()
-        user_activity.record_property_view(property)
+    def get_queryset(self):
+        return super().get_queryset().for_cards()
 
-        return super().get(request, *args, **kwargs)
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        UserActivity(request.user).record_property_view(self.object)
+        return response
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        paginator = Paginator(self.get_object().reviews.filter(status="Approved"), 5)
+        paginator = Paginator(self.object.reviews.filter(status="Approved"), 5)
         page_number = self.request.GET.get("page")
         context["reviews"] = paginator.get_page(page_number)
 
         recommender = PropertyRecommender(self.request.user)
         context["recommended_properties"] = recommender.get_recommendations(top_n=5)
+
+        context["liked_property_ids"] = UserActivity(
+            self.request.user
+        ).get_liked_property_ids(
+            [property.pk for property in context["recommended_properties"]]
+        )
+        context["reviewed_property_ids"] = set(
+            self.object.reviews.filter(user=self.request.user).values_list(
+                "property_id", flat=True
+            )[:1]
+        )
         return context
 
 
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
 from accounts.models import User
+from analytic.trending import TRENDING_WEIGHTS, add_trending_event
 from property.models import Property
 
 
@@ -33,5 +36,22 @@ class Review(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.property.update_rating()
+        with transaction.atomic():
+            # an approved review trends its property once, when approved
+            approved = self.status == self.StatusChoices.APPROVED and not (
+                self.pk
+                and Review.objects.filter(
+                    pk=self.pk, status=self.StatusChoices.APPROVED
+                ).exists()
+            )
+            super().save(*args, **kwargs)
+            self.property.update_rating()
+            if approved:
+                Property.objects.filter(pk=self.property_id).update(
+                    trending_score=add_trending_event(TRENDING_WEIGHTS["review"])
+                )
+
+
+@receiver(post_delete, sender=Review)
+def _review_post_delete_receiver(sender, instance: Review, *args, **kwargs):
+    instance.property.update_rating()